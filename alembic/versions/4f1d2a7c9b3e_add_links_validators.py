@@ -0,0 +1,35 @@
+"""add links validators
+
+Revision ID: 4f1d2a7c9b3e
+Revises: 92fdbeb09994
+Create Date: 2026-10-18 20:02:11.418307
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "4f1d2a7c9b3e"
+down_revision: Union[str, Sequence[str], None] = "92fdbeb09994"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("links", sa.Column("etag", sa.String(256), default=None))
+    op.add_column("links", sa.Column("last_modified", sa.String(50), default=None))
+    op.add_column("links", sa.Column("content_checksum", sa.String(32), default=None))
+    pass
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("links", "content_checksum")
+    op.drop_column("links", "last_modified")
+    op.drop_column("links", "etag")
+    pass
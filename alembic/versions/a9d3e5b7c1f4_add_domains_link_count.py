@@ -0,0 +1,44 @@
+"""add domains link count
+
+Revision ID: a9d3e5b7c1f4
+Revises: f3c7a2e9d5b8
+Create Date: 2026-10-19 00:21:54.903127
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a9d3e5b7c1f4"
+down_revision: Union[str, Sequence[str], None] = "f3c7a2e9d5b8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "domains",
+        sa.Column("link_count", sa.Integer, nullable=False, server_default="0"),
+    )
+    op.execute(
+        """
+        UPDATE domains SET link_count = counts.link_count
+        FROM (
+            SELECT domain_id, count(*) AS link_count FROM links
+            WHERE domain_id IS NOT NULL GROUP BY domain_id
+        ) AS counts
+        WHERE counts.domain_id = domains.id
+        """
+    )
+    pass
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("domains", "link_count")
+    pass
@@ -0,0 +1,40 @@
+"""add links url hash
+
+Revision ID: b7e3c1d9a2f4
+Revises: 4f1d2a7c9b3e
+Create Date: 2026-10-18 21:14:37.902114
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b7e3c1d9a2f4"
+down_revision: Union[str, Sequence[str], None] = "4f1d2a7c9b3e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("links", sa.Column("url_hash", sa.UUID, nullable=True))
+    # same digest as src.utils.hashing.url_hash
+    op.execute("UPDATE links SET url_hash = md5(url)::uuid")
+    op.alter_column("links", "url_hash", nullable=False)
+    op.create_unique_constraint("links_url_hash_key", "links", ["url_hash"])
+    op.drop_index("idx_links_url", table_name="links")
+    op.drop_constraint("links_url_key", "links", type_="unique")
+    pass
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_unique_constraint("links_url_key", "links", ["url"])
+    op.create_index("idx_links_url", "links", ["url"])
+    op.drop_constraint("links_url_hash_key", "links", type_="unique")
+    op.drop_column("links", "url_hash")
+    pass
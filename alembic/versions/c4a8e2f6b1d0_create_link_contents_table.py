@@ -0,0 +1,52 @@
+"""create link_contents table
+
+Revision ID: c4a8e2f6b1d0
+Revises: b7e3c1d9a2f4
+Create Date: 2026-10-18 21:52:08.117853
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c4a8e2f6b1d0"
+down_revision: Union[str, Sequence[str], None] = "b7e3c1d9a2f4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "link_contents",
+        sa.Column("link_id", sa.UUID, sa.ForeignKey("links.id"), primary_key=True),
+        sa.Column("codec", sa.String(10), nullable=False),
+        sa.Column("content", sa.LargeBinary, nullable=False),
+        sa.Column("updated_at", sa.DateTime, nullable=False),
+    )
+    # existing content is moved uncompressed, it gets compressed on its next crawl
+    op.execute(
+        "INSERT INTO link_contents (link_id, codec, content, updated_at) "
+        "SELECT id, 'none', convert_to(content, 'UTF8'), "
+        "COALESCE(last_crawled_at, LOCALTIMESTAMP) FROM links "
+        "WHERE content IS NOT NULL"
+    )
+    op.drop_column("links", "content")
+    pass
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column("links", sa.Column("content", sa.Text, default=None))
+    # compressed rows cannot be decoded in SQL and are lost
+    op.execute(
+        "UPDATE links SET content = convert_from(link_contents.content, 'UTF8') "
+        "FROM link_contents "
+        "WHERE link_contents.link_id = links.id AND link_contents.codec = 'none'"
+    )
+    op.drop_table("link_contents")
+    pass
@@ -0,0 +1,53 @@
+"""add links domain id
+
+Revision ID: d2f5a9c3e7b1
+Revises: c4a8e2f6b1d0
+Create Date: 2026-10-18 22:31:45.640218
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d2f5a9c3e7b1"
+down_revision: Union[str, Sequence[str], None] = "c4a8e2f6b1d0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "links",
+        sa.Column("domain_id", sa.UUID, sa.ForeignKey("domains.id"), default=None),
+    )
+    # same rule as URLParser.get_domain, a "www." prefix for hostnames with one dot
+    op.execute(
+        """
+        UPDATE links SET domain_id = domains.id
+        FROM (
+            SELECT id, lower(substring(url from '^[a-zA-Z]+://([^/:?#]+)')) AS host
+            FROM links
+        ) AS hosts, domains
+        WHERE hosts.id = links.id
+        AND domains.name = CASE
+            WHEN hosts.host NOT LIKE 'www%'
+                AND length(hosts.host) - length(replace(hosts.host, '.', '')) = 1
+            THEN 'www.' || hosts.host
+            ELSE hosts.host
+        END
+        """
+    )
+    op.create_index("idx_links_domain_id", "links", ["domain_id"])
+    pass
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("idx_links_domain_id", table_name="links")
+    op.drop_column("links", "domain_id")
+    pass
@@ -0,0 +1,56 @@
+"""add links recrawl schedule
+
+Revision ID: e8b4d1f6a3c2
+Revises: d2f5a9c3e7b1
+Create Date: 2026-10-18 23:12:08.517364
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e8b4d1f6a3c2"
+down_revision: Union[str, Sequence[str], None] = "d2f5a9c3e7b1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("links", sa.Column("recrawl_interval", sa.Float, default=None))
+    op.add_column("links", sa.Column("next_crawl_at", sa.DateTime, default=None))
+    # fetched links are due once their declared interval has passed, as in
+    # RECRAWL_INTERVALS, links only marked as crawled being left out
+    op.execute(
+        """
+        UPDATE links SET next_crawl_at = last_crawled_at + CASE change_freq
+            WHEN 'ALWAYS' THEN interval '1 hour'
+            WHEN 'HOURLY' THEN interval '1 hour'
+            WHEN 'DAILY' THEN interval '1 day'
+            WHEN 'WEEKLY' THEN interval '7 days'
+            WHEN 'MONTHLY' THEN interval '30 days'
+            WHEN 'YEARLY' THEN interval '365 days'
+        END
+        WHERE last_crawled_at IS NOT NULL AND http_status IS NOT NULL
+        """
+    )
+    # only the links to recrawl are indexed
+    op.create_index(
+        "idx_links_next_crawl_at",
+        "links",
+        ["next_crawl_at"],
+        postgresql_where=sa.text("next_crawl_at IS NOT NULL"),
+    )
+    pass
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("idx_links_next_crawl_at", table_name="links")
+    op.drop_column("links", "next_crawl_at")
+    op.drop_column("links", "recrawl_interval")
+    pass
@@ -0,0 +1,46 @@
+"""add links simhash
+
+Revision ID: f3c7a2e9d5b8
+Revises: e8b4d1f6a3c2
+Create Date: 2026-10-18 23:48:37.205914
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f3c7a2e9d5b8"
+down_revision: Union[str, Sequence[str], None] = "e8b4d1f6a3c2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("links", sa.Column("simhash", sa.BigInteger, default=None))
+    op.add_column("links", sa.Column("duplicate_of", sa.UUID, default=None))
+    # no foreign key to links, whose id is only unique along with domain_id once
+    # partitioned, see src.scripts.partition_links
+    op.create_table(
+        "link_simhash_bands",
+        sa.Column("link_id", sa.UUID, primary_key=True),
+        sa.Column("band", sa.SmallInteger, primary_key=True),
+        sa.Column("value", sa.Integer, nullable=False),
+    )
+    op.create_index(
+        "idx_link_simhash_bands_band_value", "link_simhash_bands", ["band", "value"]
+    )
+    pass
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("idx_link_simhash_bands_band_value", table_name="link_simhash_bands")
+    op.drop_table("link_simhash_bands")
+    op.drop_column("links", "duplicate_of")
+    op.drop_column("links", "simhash")
+    pass
@@ -58,6 +58,7 @@ if [ $mode = "start" ]; then
             worker-router-high worker-selector-1 \
             worker-selector-2 worker-selector-3 \
             worker-selector-4 worker-selector-5 \
+            worker-recrawler \
             --scale worker-domains=${NUM_DOMAINS_WORKERS:-2} \
             --scale worker-sitemaps=${NUM_SITEMAPS_WORKERS:-5} \
             --scale worker-links=${NUM_LINKS_WORKERS:-8} \
@@ -79,6 +80,7 @@ if [ $mode = "stop" ]; then
             worker-router-low worker-router-medium \
             worker-router-high worker-selector-1 \
             worker-selector-2 worker-selector-3 \
-            worker-selector-4 worker-selector-5
+            worker-selector-4 worker-selector-5 \
+            worker-recrawler
     fi
 fi
\ No newline at end of file
@@ -0,0 +1,41 @@
+import time
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from src.database.engine import (
+    discard_query_timer,
+    get_database_url,
+    get_pool_args,
+    start_query_timer,
+    stop_query_timer,
+    worker_id,
+)
+from src.prometheus_exporters import DATABASE_POOL_CHECKOUT_TIME
+
+
+class MeteredAsyncQueuePool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DATABASE_POOL_CHECKOUT_TIME.labels(worker_id=worker_id).observe(
+                time.perf_counter() - start
+            )
+
+
+# asyncpg prepares and caches statements server-side on its own
+async_engine = create_async_engine(
+    get_database_url("asyncpg"),
+    poolclass=MeteredAsyncQueuePool,
+    connect_args={"server_settings": {"application_name": worker_id}},
+    **get_pool_args(),
+)
+event.listen(async_engine.sync_engine, "before_cursor_execute", start_query_timer)
+event.listen(async_engine.sync_engine, "after_cursor_execute", stop_query_timer)
+event.listen(async_engine.sync_engine, "handle_error", discard_query_timer)
+
+# objects stay readable after commit, lazy loads are not possible with asyncio
+async_session = async_sessionmaker(async_engine, expire_on_commit=False)
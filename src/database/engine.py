@@ -1,15 +1,90 @@
 import os
+import time
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import DeclarativeBase, Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import QueuePool
+
+from src.prometheus_exporters import (
+    DATABASE_POOL_CHECKOUT_TIME,
+    DATABASE_QUERY_TIME,
+)
 
 load_dotenv()
 
+worker_id = os.getenv("HOSTNAME", "unknown")
+
+# "psycopg2", or "psycopg" for psycopg 3
+POSTGRES_DRIVER = os.getenv("POSTGRES_DRIVER", "psycopg2")
+POSTGRES_POOL_SIZE = int(os.getenv("POSTGRES_POOL_SIZE", "5"))
+POSTGRES_MAX_OVERFLOW = int(os.getenv("POSTGRES_MAX_OVERFLOW", "5"))
+POSTGRES_POOL_TIMEOUT = int(os.getenv("POSTGRES_POOL_TIMEOUT", "30"))
+POSTGRES_POOL_RECYCLE = int(os.getenv("POSTGRES_POOL_RECYCLE", "1800"))
+POSTGRES_POOL_PRE_PING = os.getenv("POSTGRES_POOL_PRE_PING", "true").lower() == "true"
+# psycopg 3 only, number of executions after which a query is prepared server-side
+POSTGRES_PREPARE_THRESHOLD = int(os.getenv("POSTGRES_PREPARE_THRESHOLD", "5"))
+
+
+class MeteredQueuePool(QueuePool):
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DATABASE_POOL_CHECKOUT_TIME.labels(worker_id=worker_id).observe(
+                time.perf_counter() - start
+            )
+
+
+def get_connect_args() -> dict:
+    connect_args = {"application_name": worker_id}
+    if POSTGRES_DRIVER == "psycopg":
+        connect_args["prepare_threshold"] = POSTGRES_PREPARE_THRESHOLD
+    return connect_args
+
+
+def get_database_url(driver: str) -> str:
+    return f"postgresql+{driver}://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}@{os.getenv('POSTGRES_HOSTNAME')}:{os.getenv('POSTGRES_FORWARD_PORT')}/{os.getenv('POSTGRES_DATABASE')}"
+
+
+def get_pool_args() -> dict:
+    return {
+        "pool_size": POSTGRES_POOL_SIZE,
+        "max_overflow": POSTGRES_MAX_OVERFLOW,
+        "pool_timeout": POSTGRES_POOL_TIMEOUT,
+        "pool_recycle": POSTGRES_POOL_RECYCLE,
+        "pool_pre_ping": POSTGRES_POOL_PRE_PING,
+    }
+
+
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info["query_start_time"].pop()
+    DATABASE_QUERY_TIME.labels(worker_id=worker_id).observe(time.perf_counter() - start)
+
+
+def discard_query_timer(context):
+    # after_cursor_execute is not called for failed statements, whose start time
+    # would be left on the pooled connection
+    if context.connection is not None and context.execution_context is not None:
+        start_times = context.connection.info.get("query_start_time")
+        if start_times:
+            start_times.pop()
+
+
 engine = create_engine(
-    f"postgresql+psycopg2://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}@{os.getenv('POSTGRES_HOSTNAME')}:{os.getenv('POSTGRES_FORWARD_PORT')}/{os.getenv('POSTGRES_DATABASE')}"
+    get_database_url(POSTGRES_DRIVER),
+    poolclass=MeteredQueuePool,
+    connect_args=get_connect_args(),
+    **get_pool_args(),
 )
-session = Session(engine)
+event.listen(engine, "before_cursor_execute", start_query_timer)
+event.listen(engine, "after_cursor_execute", stop_query_timer)
+event.listen(engine, "handle_error", discard_query_timer)
 
 
 class BaseModel(DeclarativeBase):
@@ -0,0 +1,67 @@
+import fcntl
+import logging
+import os
+import threading
+
+from sqlalchemy.orm import Session
+
+from src.database.engine import engine
+from src.repositories.LinkRepository import LinkRepository
+from src.utils.bloomfilter import BloomFilter
+from src.vars import URL_FILTER_CAPACITY, URL_FILTER_ERROR_RATE, URL_FILTER_PATH
+
+logger = logging.getLogger(__name__)
+
+_url_filter: BloomFilter | None = None
+_url_filter_lock = threading.Lock()
+
+
+def fill(url_filter: BloomFilter) -> int:
+    """
+    Adds the url hash of every link to url_filter, returns the number of links.
+    """
+    count = 0
+    with Session(engine) as session:
+        for hash in LinkRepository(session).iter_url_hashes():
+            url_filter.add(hash)
+            count += 1
+    return count
+
+
+def _build(path: str):
+    # built aside then renamed, so that a crash never leaves a partial filter
+    building_path = f"{path}.building"
+    url_filter = BloomFilter(URL_FILTER_CAPACITY, URL_FILTER_ERROR_RATE, building_path)
+    count = fill(url_filter)
+    url_filter.close()
+    os.replace(building_path, path)
+    logger.info(f"Built the url filter {path} from {count} links.")
+
+
+def get_url_filter() -> BloomFilter:
+    """
+    Returns the url-seen filter of the process, built from the links table the first
+    time. With URL_FILTER_PATH, the first process of the host builds it and the
+    others wait for it, then they all update the same file.
+    Bits written by two processes at once may be lost, which only costs an insert
+    attempt to the lost urls later on.
+    """
+    global _url_filter
+    with _url_filter_lock:
+        if _url_filter is not None:
+            return _url_filter
+        if URL_FILTER_PATH is None:
+            _url_filter = BloomFilter(URL_FILTER_CAPACITY, URL_FILTER_ERROR_RATE)
+            fill(_url_filter)
+            return _url_filter
+
+        with open(f"{URL_FILTER_PATH}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if not BloomFilter.exists(
+                URL_FILTER_PATH, URL_FILTER_CAPACITY, URL_FILTER_ERROR_RATE
+            ):
+                _build(URL_FILTER_PATH)
+            _url_filter = BloomFilter(
+                URL_FILTER_CAPACITY, URL_FILTER_ERROR_RATE, URL_FILTER_PATH
+            )
+        return _url_filter
@@ -0,0 +1,131 @@
+import os
+import time
+from typing import Any
+
+from sqlalchemy import Update, cast, column, inspect, or_, update, values
+from sqlalchemy.orm import DeclarativeBase
+
+from src.prometheus_exporters import (
+    WRITE_BEHIND_BUFFER_DEPTH,
+    WRITE_BEHIND_FLUSHED_COUNTER,
+)
+
+worker_id = os.getenv("HOSTNAME", "unknown")
+
+# rows whose version column was written later than the buffered value, by a crawl
+# committed meanwhile, are left as they are
+VERSION_COLUMN = "last_crawled_at"
+
+
+def get_changes(instance: DeclarativeBase) -> dict[str, Any]:
+    """
+    Returns the column values written on instance since it was loaded.
+    """
+    state = inspect(instance)
+    return {
+        attr.key: attr.value
+        for attr in state.attrs
+        if attr.key in state.mapper.columns and attr.history.has_changes()
+    }
+
+
+class WriteBehindBuffer:
+    """
+    Accumulates column updates of ORM instances by primary key, so that they are
+    written together in one UPDATE ... FROM (VALUES ...) per model and set of
+    columns, once max_rows are pending or interval seconds have passed.
+    Whatever is pending when the process dies is lost, that is at most max_rows
+    rows or interval seconds of updates. Buffered updates never overwrite a row
+    whose VERSION_COLUMN is more recent than theirs.
+    """
+
+    def __init__(self, max_rows: int, interval: float) -> None:
+        self._max_rows = max_rows
+        self._interval = interval
+        self._pending: dict[type[DeclarativeBase], dict[Any, dict[str, Any]]] = {}
+        self._size = 0
+        self._first_added_at: float | None = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, instance: DeclarativeBase):
+        """
+        Buffers the changes of instance, which must then be expunged or rolled back
+        instead of being committed.
+        """
+        changes = get_changes(instance)
+        if len(changes) < 1:
+            return
+        model = type(instance)
+        pending = self._pending.setdefault(model, {})
+        key = inspect(instance).identity[0]
+        if key not in pending:
+            pending[key] = {}
+            self._size += 1
+        pending[key].update(changes)
+        if self._first_added_at is None:
+            self._first_added_at = time.monotonic()
+        WRITE_BEHIND_BUFFER_DEPTH.labels(worker_id=worker_id).set(self._size)
+
+    def is_due(self) -> bool:
+        flush_in = self.next_flush_in()
+        return flush_in is not None and flush_in <= 0
+
+    def next_flush_in(self) -> float | None:
+        """
+        Seconds until the buffer is due, None when nothing is pending.
+        """
+        if self._first_added_at is None:
+            return None
+        if self._size >= self._max_rows:
+            return 0
+        return max(self._first_added_at + self._interval - time.monotonic(), 0)
+
+    def drain(self) -> list[Update]:
+        """
+        Empties the buffer and returns the statements writing its updates.
+        """
+        statements = []
+        for model, pending in self._pending.items():
+            primary_key = inspect(model).primary_key[0]
+            by_columns: dict[tuple[str, ...], list[tuple]] = {}
+            for key, changes in pending.items():
+                keys = tuple(sorted(changes))
+                row = (key, *(changes[name] for name in keys))
+                by_columns.setdefault(keys, []).append(row)
+
+            table = model.__table__
+            for keys, rows in by_columns.items():
+                rows_values = values(
+                    column(primary_key.name, primary_key.type),
+                    *(column(name, table.c[name].type) for name in keys),
+                    name="changes",
+                ).data(rows)
+                statement = (
+                    update(table)
+                    .where(primary_key == rows_values.c[primary_key.name])
+                    # VALUES columns of NULLs only would be typed as text
+                    .values(
+                        {
+                            name: cast(rows_values.c[name], table.c[name].type)
+                            for name in keys
+                        }
+                    )
+                )
+                if VERSION_COLUMN in keys:
+                    version = table.c[VERSION_COLUMN]
+                    statement = statement.where(
+                        or_(
+                            version.is_(None),
+                            version < cast(rows_values.c[VERSION_COLUMN], version.type),
+                        )
+                    )
+                statements.append(statement)
+
+        WRITE_BEHIND_FLUSHED_COUNTER.labels(worker_id=worker_id).inc(self._size)
+        self._pending = {}
+        self._size = 0
+        self._first_added_at = None
+        WRITE_BEHIND_BUFFER_DEPTH.labels(worker_id=worker_id).set(0)
+        return statements
@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import UUID, SmallInteger, String
+from sqlalchemy import UUID, Integer, SmallInteger, String
 from sqlalchemy.orm import Mapped, mapped_column
 
 from src.database.engine import BaseModel
@@ -17,6 +17,8 @@ class Domain(BaseModel):
     crawl_delay: Mapped[int] = mapped_column(SmallInteger, default=5)
     has_robots_txt: Mapped[bool | None] = mapped_column(nullable=True)
     is_blocked: Mapped[bool | None] = mapped_column(nullable=True)
+    # links inserted in the domain, see CRAWL_BUDGET_MAX_PAGES
+    link_count: Mapped[int] = mapped_column(Integer, default=0)
     last_crawled_at: Mapped[datetime | None] = mapped_column(nullable=True)
     last_processed_at: Mapped[datetime | None] = mapped_column(nullable=True)
     first_discovered_at: Mapped[datetime] = mapped_column(default=datetime.now())
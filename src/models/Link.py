@@ -2,11 +2,22 @@ import enum
 import uuid
 from datetime import datetime
 
-from sqlalchemy import UUID, DateTime, Enum, Float, SmallInteger, String, Text
+from sqlalchemy import (
+    UUID,
+    BigInteger,
+    DateTime,
+    Enum,
+    Float,
+    ForeignKey,
+    SmallInteger,
+    String,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.database.engine import BaseModel
+from src.models.Domain import Domain
 from src.models.LinkRelation import LinkRelation
+from src.utils.hashing import url_hash
 
 
 class ChangeFreq(enum.Enum):
@@ -24,24 +35,45 @@ class Link(BaseModel):
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, insert_default=uuid.uuid4
     )
-    url: Mapped[str] = mapped_column(String(512), unique=True)
+    url: Mapped[str] = mapped_column(String(512))
+    url_hash: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        unique=True,
+        insert_default=lambda context: url_hash(
+            context.get_current_parameters()["url"]
+        ),
+    )
+    domain_id: Mapped[uuid.UUID | None] = mapped_column(
+        ForeignKey("domains.id"), nullable=True
+    )
     change_freq: Mapped[ChangeFreq] = mapped_column(
         Enum(ChangeFreq), default=ChangeFreq.MONTHLY
     )
     priority: Mapped[float] = mapped_column(Float(1), default=0.5)
     lang: Mapped[str | None] = mapped_column(String(3), nullable=True)
-    content: Mapped[str | None] = mapped_column(Text, nullable=True)
     title: Mapped[str | None] = mapped_column(String(100), nullable=True)
     description: Mapped[str | None] = mapped_column(String(250), nullable=True)
     http_status: Mapped[int | None] = mapped_column(SmallInteger, nullable=True)
     content_type: Mapped[str | None] = mapped_column(String(30), nullable=True)
     keywords: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    etag: Mapped[str | None] = mapped_column(String(256), nullable=True)
+    last_modified: Mapped[str | None] = mapped_column(String(50), nullable=True)
+    content_checksum: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    # see src.utils.simhash, the page duplicate_of is indexed in link_simhash_bands
+    simhash: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    duplicate_of: Mapped[uuid.UUID | None] = mapped_column(
+        UUID(as_uuid=True), nullable=True
+    )
     last_crawled_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    # recrawl schedule, see src.utils.recrawl
+    recrawl_interval: Mapped[float | None] = mapped_column(Float, nullable=True)
+    next_crawl_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     first_discovered_at: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.now()
     )
 
     # relationships
+    domain: Mapped[Domain | None] = relationship()
     outgoing_relations: Mapped[list["LinkRelation"]] = relationship(
         foreign_keys="[LinkRelation.link_id]", back_populates="parent_link"
     )
@@ -0,0 +1,19 @@
+import uuid
+from datetime import datetime
+
+from sqlalchemy import DateTime, ForeignKey, LargeBinary, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.database.engine import BaseModel
+
+
+class LinkContent(BaseModel):
+    __tablename__ = "link_contents"
+    link_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("links.id"), primary_key=True)
+    # see src.utils.compression
+    codec: Mapped[str] = mapped_column(String(10))
+    content: Mapped[bytes] = mapped_column(LargeBinary)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+
+    def __repr__(self) -> str:
+        return f"LinkContent(link_id={self.link_id}, codec={self.codec})"
@@ -0,0 +1,21 @@
+import uuid
+
+from sqlalchemy import UUID, Integer, SmallInteger
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.database.engine import BaseModel
+
+
+class LinkSimhashBand(BaseModel):
+    """
+    One band of the SimHash of a page that is not a near-duplicate, see
+    src.utils.simhash.get_bands.
+    """
+
+    __tablename__ = "link_simhash_bands"
+    link_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    band: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    value: Mapped[int] = mapped_column(Integer)
+
+    def __repr__(self) -> str:
+        return f"LinkSimhashBand(link_id={self.link_id}, band={self.band}, value={self.value})"
@@ -1,4 +1,4 @@
-from prometheus_client import Counter, Summary
+from prometheus_client import Counter, Gauge, Summary
 
 REQUEST_TIME = Summary("request_processing_seconds", "Time spent processing request")
 DOMAIN_PROCESSED_COUNTER = Counter(
@@ -25,6 +25,18 @@ SELECTOR_LINK_ADDED_COUNTER = Counter(
     documentation="Count the number of links that have been added within a selector worker.",
     labelnames=["worker_id"],
 )
+SELECTOR_NEAR_DUPLICATE_COUNTER = Counter(
+    namespace="workers.selector",
+    name="near_duplicate_count",
+    documentation="Count the number of crawled pages found to be near-duplicates of another page.",
+    labelnames=["worker_id"],
+)
+BUDGET_DROPPED_COUNTER = Counter(
+    namespace="utils.crawlbudget",
+    name="dropped_link_count",
+    documentation="Count the number of outlinks dropped for being over the crawl budget of their domain, by reason.",
+    labelnames=["worker_id", "domain", "reason"],
+)
 SITEMAPS_LINK_ADDED_COUNTER = Counter(
     namespace="workers.sitemaps",
     name="added_link_count",
@@ -37,3 +49,75 @@ SITEMAPS_PROCESSED_COUNTER = Counter(
     documentation="Count the number of sitemaps that have been processed.",
     labelnames=["worker_id"],
 )
+HTTP_POOL_HIT_COUNTER = Counter(
+    namespace="utils.httpclient",
+    name="pool_hit_count",
+    documentation="Count the number of requests sent over a kept-alive connection.",
+    labelnames=["worker_id"],
+)
+HTTP_POOL_MISS_COUNTER = Counter(
+    namespace="utils.httpclient",
+    name="pool_miss_count",
+    documentation="Count the number of requests that had to open a new connection.",
+    labelnames=["worker_id"],
+)
+DATABASE_POOL_CHECKOUT_TIME = Summary(
+    namespace="database.engine",
+    name="pool_checkout_seconds",
+    documentation="Time spent waiting for a connection from the database pool.",
+    labelnames=["worker_id"],
+)
+DATABASE_QUERY_TIME = Summary(
+    namespace="database.engine",
+    name="query_seconds",
+    documentation="Time spent executing database queries.",
+    labelnames=["worker_id"],
+)
+DOMAIN_CACHE_HIT_COUNTER = Counter(
+    namespace="repositories.domain",
+    name="cache_hit_count",
+    documentation="Count the number of domains read from the in-process cache.",
+    labelnames=["worker_id"],
+)
+DOMAIN_CACHE_MISS_COUNTER = Counter(
+    namespace="repositories.domain",
+    name="cache_miss_count",
+    documentation="Count the number of domains that had to be read from the database.",
+    labelnames=["worker_id"],
+)
+WRITE_BEHIND_BUFFER_DEPTH = Gauge(
+    namespace="database.writebehind",
+    name="buffer_depth",
+    documentation="Number of rows waiting in the write-behind buffer.",
+    labelnames=["worker_id"],
+)
+WRITE_BEHIND_FLUSHED_COUNTER = Counter(
+    namespace="database.writebehind",
+    name="flushed_row_count",
+    documentation="Count the number of rows written by the write-behind buffer.",
+    labelnames=["worker_id"],
+)
+URL_FILTER_HIT_COUNTER = Counter(
+    namespace="repositories.link",
+    name="url_filter_hit_count",
+    documentation="Count the number of urls the url filter found, which are verified in the database.",
+    labelnames=["worker_id"],
+)
+URL_FILTER_MISS_COUNTER = Counter(
+    namespace="repositories.link",
+    name="url_filter_miss_count",
+    documentation="Count the number of urls the url filter did not find, which are inserted without a lookup.",
+    labelnames=["worker_id"],
+)
+URL_FILTER_FALSE_POSITIVE_COUNTER = Counter(
+    namespace="repositories.link",
+    name="url_filter_false_positive_count",
+    documentation="Count the number of urls the url filter found that were not in the database.",
+    labelnames=["worker_id"],
+)
+RECRAWLER_SCHEDULED_COUNTER = Counter(
+    namespace="workers.recrawler",
+    name="scheduled_link_count",
+    documentation="Count the number of due links that have been published to be crawled again.",
+    labelnames=["worker_id"],
+)
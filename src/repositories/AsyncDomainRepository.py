@@ -0,0 +1,155 @@
+import uuid
+from collections.abc import Iterable, Mapping, Sequence
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from src.models.Domain import Domain
+from src.prometheus_exporters import (
+    DOMAIN_CACHE_HIT_COUNTER,
+    DOMAIN_CACHE_MISS_COUNTER,
+)
+from src.repositories.DomainRepository import (
+    CRAWL_STATE_COLUMNS,
+    cache_domain,
+    domain_cache,
+    worker_id,
+)
+
+
+class AsyncDomainRepository:
+    """
+    asyncio counterpart of DomainRepository, sharing its domain cache.
+    """
+
+    def __init__(self, session: AsyncSession) -> None:
+        self._session = session
+        pass
+
+    async def insert_one(self, domain: Domain):
+        self._session.add(domain)
+        await self._session.flush()
+        await self._session.refresh(domain)
+
+    async def insert_many(self, *domains: Domain):
+        self._session.add_all(domains)
+        await self._session.flush()
+        for domain in domains:
+            await self._session.refresh(domain)
+
+    async def upsert_one(self, domain: Domain):
+        if domain_cache.get(domain.name) is not None:
+            return await self.find_one_by_name(domain.name)
+
+        query = (
+            insert(Domain)
+            .values(name=domain.name, protocol=domain.protocol)
+            .on_conflict_do_nothing(index_elements=["name"])
+        )
+
+        await self._session.execute(query)
+        await self._session.flush()
+
+        return await self.find_one_by_name(domain.name)
+
+    async def upsert_many(
+        self, domains: Sequence[Domain]
+    ) -> tuple[dict[str, uuid.UUID], list[str]]:
+        """
+        Same as DomainRepository.upsert_many.
+        """
+        ids = {}
+        values = {}
+        for domain in domains:
+            cached = domain_cache.get(domain.name)
+            if cached is not None:
+                ids[domain.name] = cached["id"]
+            else:
+                values[domain.name] = {"name": domain.name, "protocol": domain.protocol}
+        DOMAIN_CACHE_HIT_COUNTER.labels(worker_id=worker_id).inc(len(ids))
+        DOMAIN_CACHE_MISS_COUNTER.labels(worker_id=worker_id).inc(len(values))
+        if len(values) < 1:
+            return ids, []
+
+        query = (
+            insert(Domain)
+            .values([values[name] for name in sorted(values)])
+            .on_conflict_do_nothing(index_elements=["name"])
+            .returning(Domain.id, Domain.name)
+        )
+        inserted_names = []
+        for id, name in await self._session.execute(query):
+            ids[name] = id
+            inserted_names.append(name)
+
+        existing_names = [name for name in values if name not in ids]
+        if len(existing_names) > 0:
+            query = select(Domain).where(Domain.name.in_(existing_names))
+            for domain in await self._session.scalars(query):
+                ids[domain.name] = domain.id
+                cache_domain(domain)
+        return ids, inserted_names
+
+    async def read_all(self):
+        query = select(Domain)
+        domains = (await self._session.scalars(query)).all()
+        return domains
+
+    async def read_one(self, id: uuid.UUID):
+        query = select(Domain).where(Domain.id == id)
+        domain = await self._session.scalar(query)
+        return domain
+
+    async def find_one_by_name(self, name: str):
+        values = domain_cache.get(name)
+        if values is not None:
+            DOMAIN_CACHE_HIT_COUNTER.labels(worker_id=worker_id).inc()
+            domain = Domain(**values)
+            make_transient_to_detached(domain)
+            domain = await self._session.merge(domain, load=False)
+            await self._session.refresh(domain, CRAWL_STATE_COLUMNS)
+            return domain
+
+        DOMAIN_CACHE_MISS_COUNTER.labels(worker_id=worker_id).inc()
+        query = select(Domain).filter(Domain.name == name)
+        domain = await self._session.scalar(query)
+        if domain is not None:
+            cache_domain(domain)
+        return domain
+
+    async def read_link_counts(self, ids: Iterable[uuid.UUID]) -> dict[uuid.UUID, int]:
+        query = select(Domain.id, Domain.link_count).where(Domain.id.in_(list(ids)))
+        return {id: link_count for id, link_count in await self._session.execute(query)}
+
+    async def add_link_counts(self, counts: Mapping[uuid.UUID, int]):
+        if len(counts) < 1:
+            return
+        query = (
+            update(Domain.__table__)
+            .where(Domain.id == bindparam("domain_id"))
+            .values(link_count=Domain.link_count + bindparam("added"))
+        )
+        await self._session.execute(
+            query,
+            [
+                {"domain_id": domain_id, "added": counts[domain_id]}
+                for domain_id in sorted(counts)
+            ],
+        )
+
+    def invalidate(self, domain: Domain):
+        """
+        Must be called when a cached column of domain is written.
+        """
+        domain_cache.invalidate(domain.name)
+
+    async def delete_one(self, domain: Domain):
+        await self._session.delete(domain)
+        await self._session.flush()
+        return domain.id
+
+    async def delete_many(self, *domains: Domain):
+        for domain in domains:
+            await self.delete_one(domain)
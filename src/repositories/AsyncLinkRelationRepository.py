@@ -0,0 +1,60 @@
+import uuid
+from collections.abc import Iterable
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models.LinkRelation import LinkRelation
+
+
+class AsyncLinkRelationRepository:
+    """
+    asyncio counterpart of LinkRelationRepository.
+    """
+
+    def __init__(self, session: AsyncSession) -> None:
+        self._session = session
+        pass
+
+    async def insert_one(self, link_relation: LinkRelation):
+        self._session.add(link_relation)
+        await self._session.flush()
+        await self._session.refresh(link_relation)
+
+    async def insert_many(self, *link_relations: LinkRelation):
+        self._session.add_all(link_relations)
+        await self._session.flush()
+        for link_relation in link_relations:
+            await self._session.refresh(link_relation)
+
+    async def upsert_many(self, link_id: uuid.UUID, has_link_ids: Iterable[uuid.UUID]):
+        """
+        Same as LinkRelationRepository.upsert_many.
+        """
+        values = [
+            {"link_id": link_id, "has_link_id": has_link_id}
+            for has_link_id in dict.fromkeys(has_link_ids)
+        ]
+        if len(values) < 1:
+            return
+        query = (
+            insert(LinkRelation)
+            .values(values)
+            .on_conflict_do_nothing(index_elements=["link_id", "has_link_id"])
+        )
+        await self._session.execute(query)
+
+    async def read_all(self):
+        query = select(LinkRelation)
+        link_relation = (await self._session.scalars(query)).all()
+        return link_relation
+
+    async def find_one_by_relation(self, link_id: uuid.UUID, has_link_id: uuid.UUID):
+        query = (
+            select(LinkRelation)
+            .where(LinkRelation.link_id == link_id)
+            .where(LinkRelation.has_link_id == has_link_id)
+        )
+        link_relation = await self._session.scalar(query)
+        return link_relation
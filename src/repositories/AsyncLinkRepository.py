@@ -0,0 +1,163 @@
+import uuid
+from collections.abc import Iterable, Mapping, Sequence
+from typing import Any
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from src.models.Link import ChangeFreq, Link
+from src.repositories.LinkRepository import (
+    CREATE_STAGING_QUERY,
+    INSERT_CHUNK_SIZE,
+    LOOKUP_CHUNK_SIZE,
+    MERGE_STAGING_QUERY,
+    STAGING_COLUMNS,
+    TRUNCATE_STAGING_QUERY,
+    count_filter_usage,
+)
+from src.utils.bloomfilter import BloomFilter
+from src.utils.hashing import url_hash
+
+
+class AsyncLinkRepository:
+    """
+    asyncio counterpart of LinkRepository.
+    """
+
+    def __init__(self, session: AsyncSession) -> None:
+        self._session = session
+        pass
+
+    async def insert_one(self, link: Link):
+        self._session.add(link)
+        await self._session.flush()
+        await self._session.refresh(link)
+
+    async def insert_many(self, *links: Link):
+        self._session.add_all(links)
+        await self._session.flush()
+        for link in links:
+            await self._session.refresh(link)
+
+    async def upsert_many(
+        self,
+        values: Sequence[Mapping[str, Any]],
+        url_filter: BloomFilter | None = None,
+    ) -> tuple[dict[str, uuid.UUID], list[str]]:
+        """
+        Same as LinkRepository.upsert_many.
+        """
+        rows = {row["url"]: row for row in values}
+        if len(rows) < 1:
+            return {}, []
+
+        hashes = {url: url_hash(url) for url in rows}
+        ids = {}
+        if url_filter is not None:
+            probable_hashes = [hash for hash in hashes.values() if hash in url_filter]
+            ids = await self._find_ids_by_hash(probable_hashes)
+            count_filter_usage(len(hashes), len(probable_hashes), len(ids))
+
+        inserted_urls = []
+        new_rows = sorted(
+            (
+                {**row, "url_hash": hashes[url]}
+                for url, row in rows.items()
+                if url not in ids
+            ),
+            key=lambda row: row["url_hash"],
+        )
+        for start in range(0, len(new_rows), INSERT_CHUNK_SIZE):
+            query = (
+                insert(Link)
+                .values(new_rows[start : start + INSERT_CHUNK_SIZE])
+                .on_conflict_do_nothing()
+                .returning(Link.id, Link.url)
+            )
+            for id, url in await self._session.execute(query):
+                ids[url] = id
+                inserted_urls.append(url)
+
+        ids.update(
+            await self._find_ids_by_hash(
+                [hashes[url] for url in rows if url not in ids]
+            )
+        )
+        if url_filter is not None:
+            for hash in hashes.values():
+                url_filter.add(hash)
+        return ids, inserted_urls
+
+    async def _find_ids_by_hash(self, hashes: list[uuid.UUID]) -> dict[str, uuid.UUID]:
+        ids = {}
+        for start in range(0, len(hashes), LOOKUP_CHUNK_SIZE):
+            chunk = hashes[start : start + LOOKUP_CHUNK_SIZE]
+            query = select(Link.id, Link.url).where(Link.url_hash.in_(chunk))
+            ids.update({url: id for id, url in await self._session.execute(query)})
+        return ids
+
+    async def copy_many(
+        self,
+        rows: Iterable[tuple[str, uuid.UUID, float, ChangeFreq]],
+        url_filter: BloomFilter | None = None,
+    ) -> list[str]:
+        """
+        Same as LinkRepository.copy_many, with asyncpg's binary COPY.
+        """
+        if url_filter is not None:
+            rows = list(rows)
+            hashes = {url: url_hash(url) for url, *_ in rows}
+            probable_hashes = [hash for hash in hashes.values() if hash in url_filter]
+            known_ids = await self._find_ids_by_hash(probable_hashes)
+            count_filter_usage(len(hashes), len(probable_hashes), len(known_ids))
+            rows = [row for row in rows if row[0] not in known_ids]
+            for hash in hashes.values():
+                url_filter.add(hash)
+
+        records = [
+            (url, domain_id, priority, change_freq.name)
+            for url, domain_id, priority, change_freq in rows
+        ]
+        if len(records) < 1:
+            return []
+
+        await self._session.execute(CREATE_STAGING_QUERY)
+        connection = await self._session.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            "links_staging", records=records, columns=STAGING_COLUMNS
+        )
+        inserted_urls = list(await self._session.scalars(MERGE_STAGING_QUERY))
+        await self._session.execute(TRUNCATE_STAGING_QUERY)
+        return inserted_urls
+
+    async def read_all(self):
+        query = select(Link)
+        links = (await self._session.scalars(query)).all()
+        return links
+
+    async def read_one(self, id: uuid.UUID):
+        query = select(Link).where(Link.id == id)
+        link = await self._session.scalar(query)
+        return link
+
+    async def read_one_with_domain(self, id: uuid.UUID):
+        query = select(Link).options(joinedload(Link.domain)).where(Link.id == id)
+        link = await self._session.scalar(query)
+        return link
+
+    async def find_one_by_url(self, url: str):
+        query = select(Link).where(Link.url_hash == url_hash(url))
+        link = await self._session.scalar(query)
+        return link
+
+    async def delete_one(self, link: Link):
+        await self._session.delete(link)
+        await self._session.flush()
+        return link.id
+
+    async def delete_many(self, *links: Link):
+        for link in links:
+            await self.delete_one(link)
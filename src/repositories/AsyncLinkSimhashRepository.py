@@ -0,0 +1,47 @@
+import uuid
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models.LinkSimhashBand import LinkSimhashBand
+from src.repositories.LinkSimhashRepository import (
+    find_closest,
+    get_band_values,
+    get_candidates_query,
+)
+
+
+class AsyncLinkSimhashRepository:
+    """
+    asyncio counterpart of LinkSimhashRepository.
+    """
+
+    def __init__(self, session: AsyncSession) -> None:
+        self._session = session
+        pass
+
+    async def find_near_duplicate(
+        self,
+        link_id: uuid.UUID,
+        fingerprint: int,
+        num_bands: int,
+        max_distance: int,
+        limit: int = 100,
+    ) -> uuid.UUID | None:
+        query = get_candidates_query(link_id, fingerprint, num_bands, limit)
+        candidates = [tuple(row) for row in await self._session.execute(query)]
+        return find_closest(candidates, fingerprint, max_distance)
+
+    async def upsert_one(self, link_id: uuid.UUID, fingerprint: int, num_bands: int):
+        query = insert(LinkSimhashBand).values(
+            get_band_values(link_id, fingerprint, num_bands)
+        )
+        query = query.on_conflict_do_update(
+            index_elements=["link_id", "band"], set_={"value": query.excluded.value}
+        )
+        await self._session.execute(query)
+
+    async def delete_one(self, link_id: uuid.UUID):
+        query = delete(LinkSimhashBand).where(LinkSimhashBand.link_id == link_id)
+        await self._session.execute(query)
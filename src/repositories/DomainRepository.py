@@ -1,10 +1,36 @@
+import os
 import uuid
+from collections.abc import Iterable, Mapping, Sequence
+from typing import Any
 
-from sqlalchemy import select
+from sqlalchemy import bindparam, inspect, select, update
 from sqlalchemy.dialects.postgresql import insert
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, make_transient_to_detached
 
 from src.models.Domain import Domain
+from src.prometheus_exporters import (
+    DOMAIN_CACHE_HIT_COUNTER,
+    DOMAIN_CACHE_MISS_COUNTER,
+)
+from src.utils.cache import TTLCache
+from src.utils.parsers.urlparser import URLParser
+from src.vars import DOMAIN_CACHE_SIZE, DOMAIN_CACHE_TTL
+
+worker_id = os.getenv("HOSTNAME", "unknown")
+
+# column values of the domains read lately by any repository of the process, by name
+domain_cache: TTLCache[str, dict[str, Any]] = TTLCache(
+    DOMAIN_CACHE_SIZE, DOMAIN_CACHE_TTL
+)
+# written by the selectors of every process, read again on every cache hit
+CRAWL_STATE_COLUMNS = ["last_crawled_at", "crawl_delay"]
+
+
+def cache_domain(domain: Domain):
+    values = {
+        attr.key: getattr(domain, attr.key) for attr in inspect(Domain).column_attrs
+    }
+    domain_cache.set(domain.name, values)
 
 
 class DomainRepository:
@@ -24,6 +50,9 @@ class DomainRepository:
             self._session.refresh(domain)
 
     def upsert_one(self, domain: Domain):
+        if domain_cache.get(domain.name) is not None:
+            return self.find_one_by_name(domain.name)
+
         query = (
             insert(Domain)
             .values(name=domain.name, protocol=domain.protocol)
@@ -35,6 +64,47 @@ class DomainRepository:
 
         return self.find_one_by_name(domain.name)
 
+    def upsert_many(
+        self, domains: Sequence[Domain]
+    ) -> tuple[dict[str, uuid.UUID], list[str]]:
+        """
+        Inserts the domains whose name is neither cached nor known yet in a single
+        statement. Returns the id of every name, and the names that were inserted.
+        """
+        ids = {}
+        values = {}
+        for domain in domains:
+            cached = domain_cache.get(domain.name)
+            if cached is not None:
+                ids[domain.name] = cached["id"]
+            else:
+                values[domain.name] = {"name": domain.name, "protocol": domain.protocol}
+        DOMAIN_CACHE_HIT_COUNTER.labels(worker_id=worker_id).inc(len(ids))
+        DOMAIN_CACHE_MISS_COUNTER.labels(worker_id=worker_id).inc(len(values))
+        if len(values) < 1:
+            return ids, []
+
+        # by name in every worker, so that concurrent inserts of the same domains
+        # wait on each other instead of deadlocking
+        query = (
+            insert(Domain)
+            .values([values[name] for name in sorted(values)])
+            .on_conflict_do_nothing(index_elements=["name"])
+            .returning(Domain.id, Domain.name)
+        )
+        inserted_names = []
+        for id, name in self._session.execute(query):
+            ids[name] = id
+            inserted_names.append(name)
+
+        existing_names = [name for name in values if name not in ids]
+        if len(existing_names) > 0:
+            query = select(Domain).where(Domain.name.in_(existing_names))
+            for domain in self._session.scalars(query):
+                ids[domain.name] = domain.id
+                cache_domain(domain)
+        return ids, inserted_names
+
     def read_all(self):
         query = select(Domain)
         domains = self._session.scalars(query).all()
@@ -46,10 +116,53 @@ class DomainRepository:
         return domain
 
     def find_one_by_name(self, name: str):
+        values = domain_cache.get(name)
+        if values is not None:
+            DOMAIN_CACHE_HIT_COUNTER.labels(worker_id=worker_id).inc()
+            # attaches the cached row to the session, only reading its crawl state
+            domain = Domain(**values)
+            make_transient_to_detached(domain)
+            domain = self._session.merge(domain, load=False)
+            self._session.refresh(domain, CRAWL_STATE_COLUMNS)
+            return domain
+
+        DOMAIN_CACHE_MISS_COUNTER.labels(worker_id=worker_id).inc()
         query = select(Domain).filter(Domain.name == name)
         domain = self._session.scalar(query)
+        if domain is not None:
+            cache_domain(domain)
         return domain
 
+    def read_link_counts(self, ids: Iterable[uuid.UUID]) -> dict[uuid.UUID, int]:
+        query = select(Domain.id, Domain.link_count).where(Domain.id.in_(list(ids)))
+        return {id: link_count for id, link_count in self._session.execute(query)}
+
+    def add_link_counts(self, counts: Mapping[uuid.UUID, int]):
+        """
+        Adds counts to the link_count of the domains, by id.
+        """
+        if len(counts) < 1:
+            return
+        query = (
+            update(Domain.__table__)
+            .where(Domain.id == bindparam("domain_id"))
+            .values(link_count=Domain.link_count + bindparam("added"))
+        )
+        # in the same order in every worker, so that they never deadlock
+        self._session.execute(
+            query,
+            [
+                {"domain_id": domain_id, "added": counts[domain_id]}
+                for domain_id in sorted(counts)
+            ],
+        )
+
+    def invalidate(self, domain: Domain):
+        """
+        Must be called when a cached column of domain is written.
+        """
+        domain_cache.invalidate(domain.name)
+
     def delete_one(self, domain: Domain):
         self._session.delete(domain)
         self._session.flush()
@@ -58,3 +171,38 @@ class DomainRepository:
     def delete_many(self, *domains: Domain):
         for domain in domains:
             self.delete_one(domain)
+
+
+def get_domains(urls: Iterable[str]) -> tuple[dict[str, str], list[Domain]]:
+    """
+    Returns the domain name of every url, and the domains to upsert. Urls whose
+    domain name does not fit in the domains table are left out.
+    """
+    domain_names = {}
+    domains = {}
+    for url in urls:
+        url_parser = URLParser(url)
+        domain_name = url_parser.get_domain()
+        if len(domain_name) > 50:
+            continue
+        domain_names[url] = domain_name
+        if domain_name not in domains:
+            domains[domain_name] = Domain(
+                name=domain_name, protocol=url_parser.get_scheme()
+            )
+    return domain_names, list(domains.values())
+
+
+def upsert_domains(
+    urls: Iterable[str], session: Session
+) -> tuple[dict[str, uuid.UUID], list[str]]:
+    """
+    Returns the domain id of every url, inserting the domains that are not known yet.
+    Also returns the names of the inserted domains, to be published to the domains
+    queue.
+    """
+    domain_names, domains = get_domains(urls)
+    domain_repo = DomainRepository(session)
+    ids, new_domain_names = domain_repo.upsert_many(domains)
+    domain_ids = {url: ids[domain_name] for url, domain_name in domain_names.items()}
+    return domain_ids, new_domain_names
@@ -0,0 +1,39 @@
+import uuid
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from src.models.LinkContent import LinkContent
+from src.utils.compression import compress, decompress
+
+
+class LinkContentRepository:
+    def __init__(self, session: Session) -> None:
+        self._session = session
+        pass
+
+    def upsert_one(self, link_id: uuid.UUID, content: str):
+        codec, data = compress(content)
+        query = insert(LinkContent).values(
+            link_id=link_id, codec=codec, content=data, updated_at=datetime.now()
+        )
+        query = query.on_conflict_do_update(
+            index_elements=["link_id"],
+            set_={
+                "codec": query.excluded.codec,
+                "content": query.excluded.content,
+                "updated_at": query.excluded.updated_at,
+            },
+        )
+        self._session.execute(query)
+
+    def read_one(self, link_id: uuid.UUID) -> str | None:
+        query = select(LinkContent.codec, LinkContent.content).where(
+            LinkContent.link_id == link_id
+        )
+        row = self._session.execute(query).first()
+        if row is None:
+            return None
+        return decompress(row.codec, row.content)
@@ -1,6 +1,8 @@
 import uuid
+from collections.abc import Iterable
 
 from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 
 from src.models.LinkRelation import LinkRelation
@@ -22,6 +24,24 @@ class LinkRelationRepository:
         for link_relation in link_relations:
             self._session.refresh(link_relation)
 
+    def upsert_many(self, link_id: uuid.UUID, has_link_ids: Iterable[uuid.UUID]):
+        """
+        Relates link_id to every has_link_ids in a single statement, skipping the
+        relations that already exist.
+        """
+        values = [
+            {"link_id": link_id, "has_link_id": has_link_id}
+            for has_link_id in dict.fromkeys(has_link_ids)
+        ]
+        if len(values) < 1:
+            return
+        query = (
+            insert(LinkRelation)
+            .values(values)
+            .on_conflict_do_nothing(index_elements=["link_id", "has_link_id"])
+        )
+        self._session.execute(query)
+
     def read_all(self):
         query = select(LinkRelation)
         link_relation = self._session.scalars(query).all()
@@ -1,9 +1,64 @@
+import io
+import os
 import uuid
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from datetime import datetime
+from typing import Any
 
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, joinedload
 
-from src.models.Link import Link
+from src.models.Link import ChangeFreq, Link
+from src.prometheus_exporters import (
+    URL_FILTER_FALSE_POSITIVE_COUNTER,
+    URL_FILTER_HIT_COUNTER,
+    URL_FILTER_MISS_COUNTER,
+)
+from src.utils.bloomfilter import BloomFilter
+from src.utils.hashing import url_hash
+
+worker_id = os.getenv("HOSTNAME", "unknown")
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+STAGING_COLUMNS = ("url", "domain_id", "priority", "change_freq")
+CREATE_STAGING_QUERY = text(
+    "CREATE TEMPORARY TABLE IF NOT EXISTS links_staging ("
+    "url varchar(512), domain_id uuid, priority real, change_freq changefreq_enum)"
+)
+MERGE_STAGING_QUERY = text(
+    "INSERT INTO links (id, url, url_hash, domain_id, priority, change_freq, "
+    "first_discovered_at) "
+    "SELECT DISTINCT ON (url) gen_random_uuid(), url, md5(url)::uuid, "
+    "domain_id, priority, change_freq, LOCALTIMESTAMP "
+    "FROM links_staging ORDER BY url "
+    "ON CONFLICT DO NOTHING RETURNING url"
+)
+TRUNCATE_STAGING_QUERY = text("TRUNCATE links_staging")
+# statements bind at most 32767 parameters with asyncpg and 65535 with psycopg's
+# server-side binding, about a dozen per inserted row and one per looked up hash
+INSERT_CHUNK_SIZE = 1000
+LOOKUP_CHUNK_SIZE = 10_000
+# the earliest due links are ranked within their domain, so that a batch takes at
+# most per_domain links of each domain, and are leased until their next crawl
+LEASE_DUE_QUERY = text(
+    "WITH due AS ("
+    "SELECT id, domain_id, next_crawl_at FROM links WHERE next_crawl_at <= :now "
+    "ORDER BY next_crawl_at LIMIT :scan_size FOR UPDATE SKIP LOCKED), "
+    "ranked AS (SELECT id, next_crawl_at, row_number() OVER "
+    "(PARTITION BY domain_id ORDER BY next_crawl_at) AS domain_rank FROM due), "
+    "picked AS (SELECT id FROM ranked WHERE domain_rank <= :per_domain "
+    "ORDER BY domain_rank, next_crawl_at LIMIT :limit) "
+    "UPDATE links SET next_crawl_at = :leased_until FROM picked "
+    "WHERE links.id = picked.id RETURNING links.id"
+)
+
+
+def count_filter_usage(total: int, hits: int, found: int):
+    URL_FILTER_HIT_COUNTER.labels(worker_id=worker_id).inc(hits)
+    URL_FILTER_MISS_COUNTER.labels(worker_id=worker_id).inc(total - hits)
+    URL_FILTER_FALSE_POSITIVE_COUNTER.labels(worker_id=worker_id).inc(hits - found)
 
 
 class LinkRepository:
@@ -22,6 +77,123 @@ class LinkRepository:
         for link in links:
             self._session.refresh(link)
 
+    def upsert_many(
+        self,
+        values: Sequence[Mapping[str, Any]],
+        url_filter: BloomFilter | None = None,
+    ) -> tuple[dict[str, uuid.UUID], list[str]]:
+        """
+        Inserts the links whose url is not known yet, INSERT_CHUNK_SIZE per
+        statement, values being the column values of each link.
+        With url_filter, only the urls it may have seen are looked up first, the
+        others being inserted directly.
+        Returns the id of every url, and the urls that were inserted.
+        """
+        rows = {row["url"]: row for row in values}
+        if len(rows) < 1:
+            return {}, []
+
+        hashes = {url: url_hash(url) for url in rows}
+        ids = {}
+        if url_filter is not None:
+            probable_hashes = [hash for hash in hashes.values() if hash in url_filter]
+            ids = self._find_ids_by_hash(probable_hashes)
+            count_filter_usage(len(hashes), len(probable_hashes), len(ids))
+
+        inserted_urls = []
+        # in the same order in every worker, so that concurrent inserts of the same
+        # urls wait on each other instead of deadlocking
+        new_rows = sorted(
+            (
+                {**row, "url_hash": hashes[url]}
+                for url, row in rows.items()
+                if url not in ids
+            ),
+            key=lambda row: row["url_hash"],
+        )
+        for start in range(0, len(new_rows), INSERT_CHUNK_SIZE):
+            query = (
+                insert(Link)
+                .values(new_rows[start : start + INSERT_CHUNK_SIZE])
+                # no conflict target, url_hash is only unique along with domain_id
+                # once links is partitioned, see src.scripts.partition_links
+                .on_conflict_do_nothing()
+                .returning(Link.id, Link.url)
+            )
+            for id, url in self._session.execute(query):
+                ids[url] = id
+                inserted_urls.append(url)
+
+        # known links the filter missed, or inserted by another worker meanwhile
+        ids.update(
+            self._find_ids_by_hash([hashes[url] for url in rows if url not in ids])
+        )
+        if url_filter is not None:
+            for hash in hashes.values():
+                url_filter.add(hash)
+        return ids, inserted_urls
+
+    def _find_ids_by_hash(self, hashes: list[uuid.UUID]) -> dict[str, uuid.UUID]:
+        ids = {}
+        for start in range(0, len(hashes), LOOKUP_CHUNK_SIZE):
+            chunk = hashes[start : start + LOOKUP_CHUNK_SIZE]
+            query = select(Link.id, Link.url).where(Link.url_hash.in_(chunk))
+            ids.update({url: id for id, url in self._session.execute(query)})
+        return ids
+
+    def copy_many(
+        self,
+        rows: Iterable[tuple[str, uuid.UUID, float, ChangeFreq]],
+        url_filter: BloomFilter | None = None,
+    ) -> list[str]:
+        """
+        Streams (url, domain_id, priority, change_freq) rows into a staging table
+        with COPY, then merges them into links in a single statement.
+        With url_filter, the urls it may have seen are looked up first and the known
+        ones are left out of the COPY.
+        Returns the urls that were inserted.
+        """
+        if url_filter is not None:
+            rows = list(rows)
+            hashes = {url: url_hash(url) for url, *_ in rows}
+            probable_hashes = [hash for hash in hashes.values() if hash in url_filter]
+            known_ids = self._find_ids_by_hash(probable_hashes)
+            count_filter_usage(len(hashes), len(probable_hashes), len(known_ids))
+            rows = [row for row in rows if row[0] not in known_ids]
+            for hash in hashes.values():
+                url_filter.add(hash)
+
+        buffer = io.StringIO()
+        for url, domain_id, priority, change_freq in rows:
+            # change_freq is stored by name, as in the ORM mapping
+            buffer.write(
+                f"{url.translate(_COPY_ESCAPES)}\t{domain_id}\t{priority}\t"
+                f"{change_freq.name}\n"
+            )
+        if buffer.tell() == 0:
+            return []
+        buffer.seek(0)
+
+        # the staging table lives as long as the pooled connection
+        self._session.execute(CREATE_STAGING_QUERY)
+        copy_query = f"COPY links_staging ({', '.join(STAGING_COLUMNS)}) FROM STDIN"
+        dbapi_connection = self._session.connection().connection.dbapi_connection
+        with dbapi_connection.cursor() as cursor:
+            if hasattr(cursor, "copy_expert"):
+                # psycopg2
+                cursor.copy_expert(copy_query, buffer)
+            else:
+                # psycopg 3
+                with cursor.copy(copy_query) as copy:
+                    copy.write(buffer.getvalue())
+        inserted_urls = list(self._session.scalars(MERGE_STAGING_QUERY))
+        self._session.execute(TRUNCATE_STAGING_QUERY)
+        return inserted_urls
+
+    def iter_url_hashes(self, batch_size: int = 100_000) -> Iterator[uuid.UUID]:
+        query = select(Link.url_hash).execution_options(yield_per=batch_size)
+        yield from self._session.scalars(query)
+
     def read_all(self):
         query = select(Link)
         links = self._session.scalars(query).all()
@@ -32,11 +204,73 @@ class LinkRepository:
         link = self._session.scalar(query)
         return link
 
+    def read_many(self, ids: Iterable[uuid.UUID]):
+        query = select(Link).where(Link.id.in_(list(ids)))
+        links = self._session.scalars(query).all()
+        return links
+
+    def read_one_with_domain(self, id: uuid.UUID):
+        query = select(Link).options(joinedload(Link.domain)).where(Link.id == id)
+        link = self._session.scalar(query)
+        return link
+
     def find_one_by_url(self, url: str):
-        query = select(Link).where(Link.url == url)
+        query = select(Link).where(Link.url_hash == url_hash(url))
         link = self._session.scalar(query)
         return link
 
+    def fill_domain_ids(self, domain_ids: Mapping[uuid.UUID, uuid.UUID]):
+        """
+        Sets the domain_id of the links, by id, that do not have one yet.
+        """
+        if len(domain_ids) < 1:
+            return
+        query = (
+            update(Link.__table__)
+            .where(Link.id == bindparam("link_id"), Link.domain_id.is_(None))
+            .values(domain_id=bindparam("new_domain_id"))
+        )
+        self._session.execute(
+            query,
+            [
+                {"link_id": link_id, "new_domain_id": domain_id}
+                for link_id, domain_id in domain_ids.items()
+            ],
+        )
+
+    def mark_crawled_many(self, ids: Iterable[uuid.UUID]):
+        ids = list(ids)
+        if len(ids) < 1:
+            return
+        query = (
+            update(Link)
+            .where(Link.id.in_(ids))
+            .values(last_crawled_at=datetime.now())
+            .execution_options(synchronize_session=False)
+        )
+        self._session.execute(query)
+
+    def lease_due(
+        self,
+        limit: int,
+        scan_size: int,
+        per_domain: int,
+        leased_until: datetime,
+    ) -> list[uuid.UUID]:
+        """
+        Returns up to limit links due for a recrawl, taken among the scan_size
+        earliest due ones with at most per_domain links of a domain, and postpones
+        them to leased_until so that they are not returned again before then.
+        """
+        query = LEASE_DUE_QUERY.bindparams(
+            now=datetime.now(),
+            scan_size=scan_size,
+            per_domain=per_domain,
+            limit=limit,
+            leased_until=leased_until,
+        )
+        return list(self._session.scalars(query))
+
     def delete_one(self, link: Link):
         # TODO
         self._session.delete(link)
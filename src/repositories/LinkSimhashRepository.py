@@ -0,0 +1,80 @@
+import uuid
+
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from src.models.Link import Link
+from src.models.LinkSimhashBand import LinkSimhashBand
+from src.utils.simhash import get_bands, hamming_distance, to_unsigned
+
+
+def get_band_values(link_id: uuid.UUID, fingerprint: int, num_bands: int) -> list[dict]:
+    return [
+        {"link_id": link_id, "band": band, "value": value}
+        for band, value in enumerate(get_bands(fingerprint, num_bands))
+    ]
+
+
+def get_candidates_query(
+    link_id: uuid.UUID, fingerprint: int, num_bands: int, limit: int
+):
+    bands = list(enumerate(get_bands(fingerprint, num_bands)))
+    return (
+        select(Link.id, Link.simhash)
+        .join(LinkSimhashBand, LinkSimhashBand.link_id == Link.id)
+        .where(
+            tuple_(LinkSimhashBand.band, LinkSimhashBand.value).in_(bands),
+            LinkSimhashBand.link_id != link_id,
+        )
+        .distinct()
+        .limit(limit)
+    )
+
+
+def find_closest(
+    candidates: list[tuple[uuid.UUID, int | None]], fingerprint: int, max_distance: int
+) -> uuid.UUID | None:
+    closest_id, closest_distance = None, max_distance + 1
+    for candidate_id, candidate_simhash in candidates:
+        if candidate_simhash is None:
+            continue
+        distance = hamming_distance(fingerprint, to_unsigned(candidate_simhash))
+        if distance < closest_distance:
+            closest_id, closest_distance = candidate_id, distance
+    return closest_id
+
+
+class LinkSimhashRepository:
+    def __init__(self, session: Session) -> None:
+        self._session = session
+        pass
+
+    def find_near_duplicate(
+        self,
+        link_id: uuid.UUID,
+        fingerprint: int,
+        num_bands: int,
+        max_distance: int,
+        limit: int = 100,
+    ) -> uuid.UUID | None:
+        """
+        Returns the indexed page closest to fingerprint, within max_distance bits,
+        among up to limit pages sharing one of its bands.
+        """
+        query = get_candidates_query(link_id, fingerprint, num_bands, limit)
+        candidates = [tuple(row) for row in self._session.execute(query)]
+        return find_closest(candidates, fingerprint, max_distance)
+
+    def upsert_one(self, link_id: uuid.UUID, fingerprint: int, num_bands: int):
+        query = insert(LinkSimhashBand).values(
+            get_band_values(link_id, fingerprint, num_bands)
+        )
+        query = query.on_conflict_do_update(
+            index_elements=["link_id", "band"], set_={"value": query.excluded.value}
+        )
+        self._session.execute(query)
+
+    def delete_one(self, link_id: uuid.UUID):
+        query = delete(LinkSimhashBand).where(LinkSimhashBand.link_id == link_id)
+        self._session.execute(query)
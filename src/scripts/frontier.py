@@ -0,0 +1,59 @@
+import os
+import uuid
+from argparse import ArgumentParser
+
+from src.utils.frontier import Frontier
+from src.vars import FRONTIER_DIRECTORY
+
+
+def show_hosts(frontier: Frontier, limit: int):
+    """
+    Prints the hosts holding the most pending links.
+    """
+    print(f"{len(frontier)} links pending.")
+    for host, pending, ready_in in frontier.get_hosts(limit):
+        print(f"  {host} : {pending} links, ready in {ready_in:.0f}s")
+
+
+def set_priority(frontier: Frontier, link_id: uuid.UUID, priority: int):
+    if frontier.set_priority(link_id, priority):
+        print(f"Moved {link_id} to priority {priority}.")
+    else:
+        print(f"{link_id} is not pending in the frontier.")
+
+
+def main():
+    arg_parser = ArgumentParser()
+    arg_parser.add_argument(
+        "queue_name",
+        help="The pool of the selector started with --frontier, such as links_pool_1.",
+    )
+    arg_parser.add_argument(
+        "--hosts",
+        help="The number of hosts to print, by number of pending links.",
+        type=int,
+        default=20,
+    )
+    arg_parser.add_argument(
+        "--set-priority",
+        help="Move a pending link within its host queue, higher priorities first.",
+        nargs=2,
+        metavar=("LINK_ID", "PRIORITY"),
+    )
+    args = arg_parser.parse_args()
+
+    path = os.path.join(FRONTIER_DIRECTORY, f"{args.queue_name}.sqlite3")
+    if not os.path.exists(path):
+        print(f"No frontier at {path}.")
+        return
+    frontier = Frontier(path)
+    if args.set_priority is not None:
+        link_id, priority = args.set_priority
+        set_priority(frontier, uuid.UUID(link_id), int(priority))
+    else:
+        show_hosts(frontier, args.hosts)
+    frontier.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+from argparse import ArgumentParser
+
+from sqlalchemy import text
+
+from src.database.engine import engine
+
+
+def get_statements(partitions: int) -> list[str]:
+    statements = [
+        "ALTER TABLE links RENAME TO links_unpartitioned",
+        (
+            "CREATE TABLE links (LIKE links_unpartitioned INCLUDING DEFAULTS) "
+            "PARTITION BY HASH (domain_id)"
+        ),
+    ]
+    for remainder in range(partitions):
+        statements.append(
+            f"CREATE TABLE links_p{remainder} PARTITION OF links "
+            f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+        )
+    statements += [
+        # the rows of the links without a domain would be left orphaned
+        (
+            "DELETE FROM link_contents WHERE link_id IN "
+            "(SELECT id FROM links_unpartitioned WHERE domain_id IS NULL)"
+        ),
+        (
+            "DELETE FROM link_relations WHERE link_id IN "
+            "(SELECT id FROM links_unpartitioned WHERE domain_id IS NULL) "
+            "OR has_link_id IN "
+            "(SELECT id FROM links_unpartitioned WHERE domain_id IS NULL)"
+        ),
+        (
+            "DELETE FROM link_simhash_bands WHERE link_id IN "
+            "(SELECT id FROM links_unpartitioned WHERE domain_id IS NULL)"
+        ),
+        (
+            "INSERT INTO links SELECT * FROM links_unpartitioned "
+            "WHERE domain_id IS NOT NULL"
+        ),
+        # foreign keys must reference a unique key, and links.id is only unique
+        # along with domain_id once partitioned, so that link_contents.link_id is
+        # no longer checked
+        "ALTER TABLE link_contents DROP CONSTRAINT IF EXISTS link_contents_link_id_fkey",
+        "DROP TABLE links_unpartitioned",
+        "ALTER TABLE links ALTER COLUMN domain_id SET NOT NULL",
+        "ALTER TABLE links ADD CONSTRAINT links_pkey PRIMARY KEY (id, domain_id)",
+        (
+            "ALTER TABLE links ADD CONSTRAINT links_url_hash_key "
+            "UNIQUE (url_hash, domain_id)"
+        ),
+        (
+            "ALTER TABLE links ADD CONSTRAINT links_domain_id_fkey "
+            "FOREIGN KEY (domain_id) REFERENCES domains (id)"
+        ),
+        "CREATE INDEX idx_links_domain_id ON links (domain_id)",
+        (
+            "CREATE INDEX idx_links_next_crawl_at ON links (next_crawl_at) "
+            "WHERE next_crawl_at IS NOT NULL"
+        ),
+    ]
+    return statements
+
+
+def partition_links(partitions: int, dry_run: bool):
+    """
+    Rebuilds links as a table hash-partitioned by domain_id, so that per-domain
+    queries only scan one partition. Links without a domain_id are dropped, along
+    with their contents, relations and simhash bands.
+    """
+    statements = get_statements(partitions)
+    if dry_run:
+        for statement in statements:
+            print(f"{statement};")
+        return
+
+    with engine.begin() as connection:
+        orphans = connection.scalar(
+            text("SELECT count(*) FROM links WHERE domain_id IS NULL")
+        )
+        print(f"Dropping {orphans} links without a domain.")
+        for statement in statements:
+            connection.execute(text(statement))
+    print(f"Partitioned links into {partitions} partitions.")
+
+
+def main():
+    arg_parser = ArgumentParser()
+    arg_parser.add_argument(
+        "--partitions",
+        help="The number of hash partitions to create.",
+        type=int,
+        default=16,
+    )
+    arg_parser.add_argument(
+        "--dry-run",
+        help="Print the statements instead of running them.",
+        action="store_true",
+    )
+    args = arg_parser.parse_args()
+    partition_links(args.partitions, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
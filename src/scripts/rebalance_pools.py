@@ -0,0 +1,163 @@
+import os
+import uuid
+from argparse import ArgumentParser
+from collections import Counter
+
+from dotenv import load_dotenv
+from pika import BlockingConnection, ConnectionParameters, PlainCredentials
+from pika.adapters.blocking_connection import BlockingChannel
+from sqlalchemy.orm import Session
+
+from src.database.engine import engine
+from src.repositories.DomainRepository import DomainRepository
+from src.repositories.LinkRepository import LinkRepository
+from src.utils.hashring import get_pool_queue, get_pool_ring
+from src.utils.messaging import (
+    BatchPublisher,
+    declare_priority_pool,
+    decode_batch,
+)
+from src.utils.parsers.urlparser import URLParser
+from src.vars import NUM_SELECTOR_POOLS, POOL_PREFIX, PRIORITY_POOL_PREFIX
+
+load_dotenv()
+
+REBALANCE_QUEUE = "links_pool_rebalance"
+
+
+def declare_pool(channel: BlockingChannel, queue_name: str, dispatch: bool):
+    if dispatch:
+        declare_priority_pool(channel, queue_name)
+    else:
+        channel.queue_declare(queue=queue_name)
+
+
+def count_moves(old_num_pools: int, new_num_pools: int):
+    """
+    Prints how many of the known domains would change of pool.
+    """
+    with Session(engine) as session:
+        domain_names = [domain.name for domain in DomainRepository(session).read_all()]
+    old_ring = get_pool_ring(old_num_pools)
+    new_ring = get_pool_ring(new_num_pools)
+    moves = Counter(
+        (old_ring.get(domain_name), new_ring.get(domain_name))
+        for domain_name in domain_names
+    )
+    moved = sum(count for (old, new), count in moves.items() if old != new)
+    print(f"{moved} of {len(domain_names)} domains would change of pool.")
+    for (old, new), count in sorted(moves.items()):
+        if old != new:
+            print(f"  pool {old} -> pool {new} : {count} domains")
+
+
+def move_messages(channel: BlockingChannel, from_queue: str, to_queue: str) -> int:
+    moved = 0
+    while True:
+        method, properties, body = channel.basic_get(queue=from_queue)
+        if method is None:
+            return moved
+        channel.basic_publish(
+            exchange="", routing_key=to_queue, body=body, properties=properties
+        )
+        channel.basic_ack(delivery_tag=method.delivery_tag)
+        moved += 1
+
+
+def route_messages(
+    channel: BlockingChannel, prefix: str, new_num_pools: int
+) -> Counter:
+    routed = Counter()
+    publisher = BatchPublisher(channel)
+    while True:
+        method, properties, body = channel.basic_get(queue=REBALANCE_QUEUE)
+        if method is None:
+            return routed
+        link_ids = [
+            uuid.UUID(item) for item in decode_batch(body, properties.content_type)
+        ]
+        with Session(engine) as session:
+            links = LinkRepository(session).read_many(link_ids)
+            urls = {link.id: link.url for link in links}
+        for link_id, url in urls.items():
+            domain_name = URLParser(url).get_domain()
+            queue_name = get_pool_queue(domain_name, prefix, new_num_pools)
+            publisher.publish(queue_name, str(link_id), properties.priority)
+            routed[queue_name] += 1
+        publisher.flush()
+        channel.basic_ack(delivery_tag=method.delivery_tag)
+
+
+def rebalance_pools(
+    old_num_pools: int, new_num_pools: int, dispatch: bool, dry_run: bool
+):
+    """
+    Moves the links waiting in the selector pools to the pools of their domain once
+    there are new_num_pools pools. Selectors and routers must be stopped meanwhile.
+    """
+    count_moves(old_num_pools, new_num_pools)
+    if dry_run:
+        return
+
+    connection = BlockingConnection(
+        ConnectionParameters(
+            host=os.getenv("RABBITMQ_HOSTNAME", "localhost"),
+            port=os.getenv("RABBITMQ_AMQP_FORWARD_PORT", 5672),
+            credentials=PlainCredentials(
+                os.getenv("RABBITMQ_USERNAME", "guest"),
+                os.getenv("RABBITMQ_PASSWORD", "guest"),
+            ),
+        )
+    )
+    channel = connection.channel()
+    # publishes block until the broker has them, before originals are acked
+    channel.confirm_delivery()
+
+    prefix = PRIORITY_POOL_PREFIX if dispatch else POOL_PREFIX
+    # every message is first moved aside, so that none is read twice
+    declare_pool(channel, REBALANCE_QUEUE, dispatch)
+    for index in range(1, max(old_num_pools, new_num_pools) + 1):
+        queue_name = f"{prefix}{index}"
+        declare_pool(channel, queue_name, dispatch)
+        moved = move_messages(channel, queue_name, REBALANCE_QUEUE)
+        print(f"Moved {moved} messages out of {queue_name}.")
+        if index > new_num_pools:
+            channel.queue_delete(queue=queue_name)
+            print(f"Deleted {queue_name}.")
+
+    routed = route_messages(channel, prefix, new_num_pools)
+    for queue_name, count in sorted(routed.items()):
+        print(f"Routed {count} links to {queue_name}.")
+    channel.queue_delete(queue=REBALANCE_QUEUE)
+    connection.close()
+
+
+def main():
+    arg_parser = ArgumentParser()
+    arg_parser.add_argument(
+        "old_num_pools",
+        help="The number of pools the links were routed to until now.",
+        type=int,
+    )
+    arg_parser.add_argument(
+        "--new-num-pools",
+        help="The number of pools to route the links to.",
+        type=int,
+        default=NUM_SELECTOR_POOLS,
+    )
+    arg_parser.add_argument(
+        "--dispatch",
+        help="Rebalance the priority pools fed by links workers started with --dispatch.",
+        action="store_true",
+    )
+    arg_parser.add_argument(
+        "--dry-run",
+        help="Only print how many domains would change of pool.",
+        action="store_true",
+    )
+    args = arg_parser.parse_args()
+    rebalance_pools(args.old_num_pools, args.new_num_pools, args.dispatch, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import math
+import mmap
+import os
+import struct
+import uuid
+
+HEADER = struct.Struct("<4sQI")
+MAGIC = b"BLM1"
+
+
+def get_size(capacity: int, error_rate: float) -> tuple[int, int]:
+    """
+    Returns the number of bits and of hashes for capacity keys to be stored with a
+    false positive rate of error_rate.
+    """
+    num_bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+    num_hashes = max(round(num_bits / capacity * math.log(2)), 1)
+    return num_bits, num_hashes
+
+
+class BloomFilter:
+    """
+    Bloom filter of 128-bit keys such as url hashes, which may return false
+    positives but never false negatives. The bits of a key are derived from its two
+    64-bit halves by double hashing, the keys being uniformly distributed already.
+    When path is given, the bits are memory-mapped from that file, so that every
+    process opening it shares them.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, path: str | None = None):
+        self._num_bits, self._num_hashes = get_size(capacity, error_rate)
+        header = HEADER.pack(MAGIC, self._num_bits, self._num_hashes)
+        size = HEADER.size + math.ceil(self._num_bits / 8)
+        self._file = None
+        if path is None:
+            self._bits: bytearray | mmap.mmap = bytearray(size)
+            self._bits[: HEADER.size] = header
+            return
+
+        self._file = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), "r+b")
+        if self._file.read(HEADER.size) != header:
+            # new, or sized for other parameters
+            self._file.truncate(0)
+            self._file.seek(0)
+            self._file.write(header)
+            self._file.truncate(size)
+            self._file.flush()
+        self._bits = mmap.mmap(self._file.fileno(), size)
+
+    @staticmethod
+    def exists(path: str, capacity: int, error_rate: float) -> bool:
+        """
+        Returns whether path holds a filter of the given parameters.
+        """
+        if not os.path.exists(path):
+            return False
+        with open(path, "rb") as file:
+            return file.read(HEADER.size) == HEADER.pack(
+                MAGIC, *get_size(capacity, error_rate)
+            )
+
+    def _positions(self, key: uuid.UUID) -> list[int]:
+        low = key.int & 0xFFFFFFFFFFFFFFFF
+        high = (key.int >> 64) | 1
+        return [(low + i * high) % self._num_bits for i in range(self._num_hashes)]
+
+    def add(self, key: uuid.UUID):
+        for position in self._positions(key):
+            self._bits[HEADER.size + (position >> 3)] |= 1 << (position & 7)
+
+    def __contains__(self, key: uuid.UUID) -> bool:
+        return all(
+            self._bits[HEADER.size + (position >> 3)] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+    def close(self):
+        if self._file is not None:
+            self._bits.flush()
+            self._bits.close()
+            self._file.close()
@@ -0,0 +1,154 @@
+import re
+from collections.abc import Iterable
+from functools import lru_cache
+from urllib.parse import quote, unquote, urljoin, urlsplit
+
+from src.vars import (
+    TRACKING_PARAMETERS,
+    URL_CANONICAL_CACHE_SIZE,
+    URL_ORIGIN_CACHE_SIZE,
+    URL_QUERY_POLICY,
+)
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+UNRESERVED_CHARS = frozenset(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~"
+)
+PATH_SAFE_CHARS = "/:@!$&'()*+,;=-._~%"
+QUERY_SAFE_CHARS = "/?:@!$'()*+,;-._~%"
+
+_PERCENT_ESCAPE = re.compile(r"%([0-9A-Fa-f]{2})")
+_STRAY_PERCENT = re.compile(r"%(?![0-9A-Fa-f]{2})")
+_SESSION_PATH_PARAMETER = re.compile(r";jsessionid=[^/]*", re.IGNORECASE)
+_IGNORED_CHARS = str.maketrans("", "", "\t\n\r")
+
+
+def _normalize_escape(match: re.Match) -> str:
+    char = chr(int(match.group(1), 16))
+    if char in UNRESERVED_CHARS:
+        return char
+    return f"%{match.group(1).upper()}"
+
+
+def _normalize_percent_encoding(component: str, safe: str) -> str:
+    """
+    Decodes escaped unreserved characters, uppercases the remaining escapes
+    and escapes whatever is not allowed in the component.
+    """
+    component = _STRAY_PERCENT.sub("%25", component)
+    component = _PERCENT_ESCAPE.sub(_normalize_escape, component)
+    return quote(component, safe=safe)
+
+
+def _remove_dot_segments(path: str) -> str:
+    # RFC 3986 section 5.2.4
+    if "." not in path:
+        return path
+    segments = []
+    for segment in path.split("/")[1:]:
+        if segment == "..":
+            if segments:
+                segments.pop()
+        elif segment != ".":
+            segments.append(segment)
+    if path.endswith(("/.", "/..")):
+        segments.append("")
+    return "/" + "/".join(segments)
+
+
+def _is_tracking_parameter(name: str) -> bool:
+    name = unquote(name).lower()
+    return name.startswith("utm_") or name in TRACKING_PARAMETERS
+
+
+def _normalize_query(query: str, policy: str) -> str:
+    if policy == "drop" or not query:
+        return ""
+    parameters = []
+    for parameter in query.split("&"):
+        if not parameter:
+            continue
+        name, separator, value = parameter.partition("=")
+        if policy != "keep" and _is_tracking_parameter(name):
+            continue
+        parameters.append(
+            _normalize_percent_encoding(name, QUERY_SAFE_CHARS)
+            + separator
+            + _normalize_percent_encoding(value, QUERY_SAFE_CHARS + "=")
+        )
+    if policy == "sort":
+        parameters.sort()
+    return "&".join(parameters)
+
+
+@lru_cache(maxsize=URL_ORIGIN_CACHE_SIZE)
+def _canonicalize_origin(scheme: str, netloc: str) -> str | None:
+    scheme = scheme.lower()
+    if scheme not in DEFAULT_PORTS:
+        return None
+    parts = urlsplit(f"{scheme}://{netloc}")
+    try:
+        port = parts.port
+    except ValueError:
+        return None
+    host = parts.hostname
+    if not host:
+        return None
+    host = host.rstrip(".")
+    if not host.isascii():
+        try:
+            host = host.encode("idna").decode("ascii")
+        except UnicodeError:
+            return None
+    if ":" in host:
+        host = f"[{host}]"
+    if port is not None and port != DEFAULT_PORTS[scheme]:
+        host = f"{host}:{port}"
+    return f"{scheme}://{host}"
+
+
+@lru_cache(maxsize=URL_CANONICAL_CACHE_SIZE)
+def canonicalize(url: str, query_policy: str = URL_QUERY_POLICY) -> str | None:
+    """
+    Returns the canonical form of an absolute http(s) URL, or None when the URL
+    cannot be crawled. query_policy is one of :
+    - keep: keeps every query parameter, in order
+    - strip: drops tracking parameters
+    - sort: drops tracking parameters and sorts the remaining ones
+    - drop: drops the whole query string
+    """
+    try:
+        parts = urlsplit(url.strip().translate(_IGNORED_CHARS))
+    except ValueError:
+        return None
+    origin = _canonicalize_origin(parts.scheme, parts.netloc)
+    if origin is None:
+        return None
+
+    path = _SESSION_PATH_PARAMETER.sub("", parts.path)
+    path = _remove_dot_segments(_normalize_percent_encoding(path, PATH_SAFE_CHARS))
+    if not path:
+        path = "/"
+    query = _normalize_query(parts.query, query_policy)
+    if query:
+        return f"{origin}{path}?{query}"
+    return f"{origin}{path}"
+
+
+def canonicalize_many(
+    hrefs: Iterable[str], base_url: str, query_policy: str = URL_QUERY_POLICY
+) -> list[str]:
+    """
+    Resolves hrefs found on a page against base_url and returns their canonical
+    forms, deduplicated in order.
+    """
+    urls: dict[str, None] = {}
+    for href in hrefs:
+        try:
+            absolute_url = urljoin(base_url, href.strip().translate(_IGNORED_CHARS))
+        except ValueError:
+            continue
+        url = canonicalize(absolute_url, query_policy)
+        if url is not None:
+            urls[url] = None
+    return list(urls)
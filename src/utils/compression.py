@@ -0,0 +1,34 @@
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from src.vars import CONTENT_COMPRESSION_LEVEL
+
+# codec used for new content, zstd when the "zstd" extra is installed
+CODEC = "zstd" if zstandard is not None else "zlib"
+
+
+def compress(text: str) -> tuple[str, bytes]:
+    """
+    Returns the codec used and the compressed text.
+    """
+    data = text.encode(errors="replace")
+    if CODEC == "zstd":
+        compressor = zstandard.ZstdCompressor(level=CONTENT_COMPRESSION_LEVEL)
+        return CODEC, compressor.compress(data)
+    return CODEC, zlib.compress(data, CONTENT_COMPRESSION_LEVEL)
+
+
+def decompress(codec: str, data: bytes) -> str:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd content requires the zstandard package.")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif codec == "zlib":
+        data = zlib.decompress(data)
+    elif codec != "none":
+        raise ValueError(f"Unknown codec {codec}.")
+    return data.decode(errors="replace")
@@ -0,0 +1,130 @@
+import logging
+import re
+import uuid
+from collections.abc import Mapping
+from datetime import datetime
+from typing import NamedTuple
+
+from src.models.Domain import Domain
+from src.models.Link import Link
+from src.utils.hashing import checksum
+from src.utils.httpclient import is_html
+from src.utils.parsers.crawlparser import CrawlResult
+from src.utils.simhash import simhash
+from src.vars import MAX_CONTENT_CHARS, SIMHASH_MIN_TOKENS, SIMHASH_SHINGLE_SIZE
+
+logger = logging.getLogger(__name__)
+
+URL_PATTERN = r"https?:\/\/(www\.)?[-a-zA-Z0-9@:%._\+~#=]{1,256}\.[a-zA-Z0-9()]{1,6}\b([-a-zA-Z0-9()@:%_\+.~#?&//=]*)"
+
+
+def get_crawl_wait(domain: Domain) -> int:
+    if domain.last_crawled_at is None:
+        return 0
+    crawl_delay = domain.crawl_delay
+    now = datetime.now()
+    diff = int((now - domain.last_crawled_at).total_seconds())
+    if diff < crawl_delay:
+        return crawl_delay - diff
+    return 0
+
+
+def get_conditional_headers(link: Link) -> dict[str, str]:
+    headers = {}
+    if link.etag is not None:
+        headers["If-None-Match"] = link.etag
+    if link.last_modified is not None:
+        headers["If-Modified-Since"] = link.last_modified
+    return headers
+
+
+class Discovered(NamedTuple):
+    urls: list[str]
+    domain_names: list[str]
+
+
+def update_link(
+    base_link: Link,
+    domain: Domain,
+    status_code: int,
+    headers: Mapping[str, str],
+    text: str | None,
+) -> bool:
+    """
+    Stores the response metadata on base_link and domain.
+    Returns whether text is a changed HTML page whose content and links are to be
+    stored.
+    """
+    domain.last_crawled_at = datetime.now()
+    base_link.last_crawled_at = datetime.now()
+    if status_code == 304:
+        logger.info(f"Skipping {base_link.url}. Not modified since last crawl")
+        return False
+
+    base_link.http_status = status_code
+    if status_code >= 400 and status_code <= 500:
+        logger.info(f"Skipping {base_link.url}. Status code {status_code}")
+        return False
+
+    content_type = headers.get("Content-Type")
+    base_link.content_type = content_type
+    if not is_html(content_type) or text is None:
+        return False
+
+    etag = headers.get("ETag")
+    base_link.etag = etag if etag is not None and len(etag) <= 256 else None
+    last_modified = headers.get("Last-Modified")
+    base_link.last_modified = (
+        last_modified
+        if last_modified is not None and len(last_modified) <= 50
+        else None
+    )
+    content_checksum = checksum(text)
+    if content_checksum == base_link.content_checksum:
+        logger.info(f"Skipping {base_link.url}. Content did not change")
+        return False
+    base_link.content_checksum = content_checksum
+    return True
+
+
+def get_content(result: CrawlResult) -> str | None:
+    content = result.semantic_content
+    if content is not None and len(content) > MAX_CONTENT_CHARS:
+        content = content[:MAX_CONTENT_CHARS] + "...[truncated]"
+    return content
+
+
+def get_fingerprint(content: str | None) -> int | None:
+    if content is None:
+        return None
+    return simhash(content, SIMHASH_SHINGLE_SIZE, SIMHASH_MIN_TOKENS)
+
+
+def get_outlinks(result: CrawlResult) -> list[str]:
+    # hrefs are resolved against the page URL and canonicalized
+    outlinks = []
+    for href in result.hrefs:
+        href_match = re.match(URL_PATTERN, href)
+        if href_match is None:
+            logger.error(f"href did not match URL pattern: {href}")
+            continue
+        if len(href) > 512:
+            continue
+        outlinks.append(href)
+    return outlinks
+
+
+def get_outlink_values(
+    result: CrawlResult, domain_ids: Mapping[str, uuid.UUID]
+) -> list[dict]:
+    return [
+        {
+            "url": url,
+            "domain_id": domain_id,
+            "title": result.title,
+            "description": result.description,
+            "keywords": result.keywords,
+            "lang": result.lang,
+        }
+        for url, domain_id in domain_ids.items()
+    ]
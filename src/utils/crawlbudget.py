@@ -0,0 +1,140 @@
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from collections.abc import Mapping
+from urllib.parse import parse_qsl, urlparse
+
+from src.prometheus_exporters import BUDGET_DROPPED_COUNTER
+from src.utils.parsers.urlparser import URLParser
+from src.vars import (
+    CRAWL_BUDGET_MAX_DEPTH,
+    CRAWL_BUDGET_MAX_PAGES,
+    CRAWL_BUDGET_MAX_QUERY_PATTERNS,
+    CRAWL_BUDGET_MAX_REPEATS,
+    CRAWL_BUDGET_MAX_TEMPLATES,
+)
+
+worker_id = os.getenv("HOSTNAME", "unknown")
+
+DIGITS_PATTERN = re.compile(r"\d+")
+
+
+def get_path_template(path: str) -> str:
+    """
+    Path with its numbers replaced, so that /events/2024/05 and /events/2025/11
+    share a template.
+    """
+    return DIGITS_PATTERN.sub("{n}", path)
+
+
+def get_query_pattern(query: str) -> str:
+    """
+    Names of the query parameters, whatever their values and order.
+    """
+    names = {name for name, _ in parse_qsl(query, keep_blank_values=True)}
+    return "&".join(sorted(names))
+
+
+class CrawlBudget:
+    """
+    Tells the urls of a domain that look like crawler traps: paths deeper than
+    max_depth, paths repeating a segment more than max_repeats times, and path
+    templates already seen with max_query_patterns sets of query parameters, as
+    faceted search produces.
+    The query patterns of the max_templates latest path templates are kept, as
+    hashes, by each process. A selector only sees the urls found on the pages it
+    crawled, so that a domain linked from the pages of several pools is budgeted
+    apart by each of their selectors.
+    """
+
+    def __init__(
+        self,
+        max_depth: int,
+        max_repeats: int,
+        max_query_patterns: int,
+        max_templates: int,
+    ) -> None:
+        self._max_depth = max_depth
+        self._max_repeats = max_repeats
+        self._max_query_patterns = max_query_patterns
+        self._max_templates = max_templates
+        self._query_patterns: OrderedDict[tuple[str, str], set[int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, domain_name: str, url: str) -> str | None:
+        """
+        Returns why url is over budget, "depth", "repeats" or "query_patterns", or
+        None when it may be crawled.
+        """
+        parsed_url = urlparse(url)
+        segments = [segment for segment in parsed_url.path.split("/") if segment]
+        if len(segments) > self._max_depth:
+            return "depth"
+        if len(segments) > 0 and max(map(segments.count, segments)) > self._max_repeats:
+            return "repeats"
+        if len(parsed_url.query) < 1:
+            return None
+
+        key = (domain_name, get_path_template(parsed_url.path))
+        pattern = hash(get_query_pattern(parsed_url.query))
+        with self._lock:
+            patterns = self._query_patterns.get(key)
+            if patterns is None:
+                patterns = self._query_patterns[key] = set()
+                while len(self._query_patterns) > self._max_templates:
+                    self._query_patterns.popitem(last=False)
+            self._query_patterns.move_to_end(key)
+            if pattern in patterns:
+                return None
+            if len(patterns) >= self._max_query_patterns:
+                return "query_patterns"
+            patterns.add(pattern)
+        return None
+
+
+# outlinks found by the pages crawled in this process
+crawl_budget = CrawlBudget(
+    CRAWL_BUDGET_MAX_DEPTH,
+    CRAWL_BUDGET_MAX_REPEATS,
+    CRAWL_BUDGET_MAX_QUERY_PATTERNS,
+    CRAWL_BUDGET_MAX_TEMPLATES,
+)
+
+
+def count_dropped(domain_name: str, reason: str):
+    BUDGET_DROPPED_COUNTER.labels(
+        worker_id=worker_id, domain=domain_name, reason=reason
+    ).inc()
+
+
+def filter_traps(urls: list[str]) -> list[str]:
+    """
+    Leaves out the urls that look like crawler traps, see CrawlBudget.
+    """
+    allowed = []
+    for url in urls:
+        domain_name = URLParser(url).get_domain()
+        reason = crawl_budget.check(domain_name, url)
+        if reason is None:
+            allowed.append(url)
+        else:
+            count_dropped(domain_name, reason)
+    return allowed
+
+
+def filter_over_budget(
+    domain_ids: Mapping[str, uuid.UUID], link_counts: Mapping[uuid.UUID, int]
+) -> dict[str, uuid.UUID]:
+    """
+    Leaves out the urls of the domains holding CRAWL_BUDGET_MAX_PAGES links, by
+    their link_count. A domain may exceed it by the links inserted meanwhile.
+    """
+    allowed = {}
+    for url, domain_id in domain_ids.items():
+        if link_counts.get(domain_id, 0) < CRAWL_BUDGET_MAX_PAGES:
+            allowed[url] = domain_id
+        else:
+            count_dropped(URLParser(url).get_domain(), "pages")
+    return allowed
@@ -0,0 +1,222 @@
+import sqlite3
+import time
+import uuid
+from collections.abc import Iterable
+from typing import NamedTuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hosts (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    crawl_delay REAL NOT NULL,
+    next_fetch_at REAL NOT NULL,
+    pending INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_hosts_next_fetch_at
+    ON hosts (next_fetch_at) WHERE pending > 0;
+CREATE TABLE IF NOT EXISTS urls (
+    seq INTEGER PRIMARY KEY,
+    host_id INTEGER NOT NULL,
+    priority INTEGER NOT NULL,
+    link_id BLOB NOT NULL UNIQUE,
+    leased INTEGER NOT NULL DEFAULT 0
+);
+"""
+# after the column is added to frontiers created without it
+INDEX_SCHEMA = """
+DROP INDEX IF EXISTS idx_urls_host_id;
+CREATE INDEX IF NOT EXISTS idx_urls_host_id_leased
+    ON urls (host_id, leased, priority DESC, seq);
+"""
+
+
+class FrontierEntry(NamedTuple):
+    host: str
+    link_id: uuid.UUID
+    priority: int
+
+
+class Frontier:
+    """
+    Persistent counterpart of PolitenessScheduler, stored in a SQLite file so that
+    millions of links can wait on local disk instead of in the broker.
+    Every host has a back queue of links ordered by priority, then by arrival, and
+    the hosts holding links form a heap on the time they may be fetched next.
+    A link is only queued once, as its 16-byte id, its priority and a host id.
+    Popped links stay leased until done or retry is called with them, so that the
+    links being crawled when the process stops are queued again by
+    requeue_leased.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        self._connection.executescript(SCHEMA)
+        columns = [
+            row[1] for row in self._connection.execute("PRAGMA table_info(urls)")
+        ]
+        if "leased" not in columns:
+            self._connection.execute(
+                "ALTER TABLE urls ADD COLUMN leased INTEGER NOT NULL DEFAULT 0"
+            )
+        self._connection.executescript(INDEX_SCHEMA)
+
+    def __len__(self) -> int:
+        (size,) = self._connection.execute(
+            "SELECT COALESCE(SUM(pending), 0) FROM hosts"
+        ).fetchone()
+        return size
+
+    def _upsert_host(self, host: str, crawl_delay: float, next_fetch_at: float) -> int:
+        (host_id,) = self._connection.execute(
+            "INSERT INTO hosts (name, crawl_delay, next_fetch_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET crawl_delay = excluded.crawl_delay, "
+            "next_fetch_at = MAX(next_fetch_at, excluded.next_fetch_at) "
+            "RETURNING id",
+            (host, crawl_delay, next_fetch_at),
+        ).fetchone()
+        return host_id
+
+    def push_many(self, entries: Iterable[tuple[FrontierEntry, float, float]]) -> int:
+        """
+        Queues (entry, crawl_delay, wait) entries in one transaction, wait being the
+        seconds before the host may be fetched. Returns how many links were not
+        queued already.
+        """
+        now = time.time()
+        added = 0
+        with self._connection:
+            for entry, crawl_delay, wait in entries:
+                host_id = self._upsert_host(entry.host, crawl_delay, now + wait)
+                cursor = self._connection.execute(
+                    "INSERT OR IGNORE INTO urls (host_id, priority, link_id) "
+                    "VALUES (?, ?, ?)",
+                    (host_id, entry.priority, entry.link_id.bytes),
+                )
+                if cursor.rowcount > 0:
+                    self._connection.execute(
+                        "UPDATE hosts SET pending = pending + 1 WHERE id = ?",
+                        (host_id,),
+                    )
+                    added += 1
+        return added
+
+    def retry(self, entry: FrontierEntry, wait: float):
+        """
+        Puts back a popped link that could not be fetched yet in front of its host
+        queue.
+        """
+        with self._connection:
+            (host_id,) = self._connection.execute(
+                "SELECT id FROM hosts WHERE name = ?", (entry.host,)
+            ).fetchone()
+            cursor = self._connection.execute(
+                "UPDATE urls SET leased = 0, "
+                "seq = (SELECT COALESCE(MIN(seq), 0) - 1 FROM urls) "
+                "WHERE link_id = ? AND leased = 1",
+                (entry.link_id.bytes,),
+            )
+            self._connection.execute(
+                "UPDATE hosts SET next_fetch_at = ?, pending = pending + ? "
+                "WHERE id = ?",
+                (time.time() + wait, cursor.rowcount, host_id),
+            )
+
+    def done(self, entry: FrontierEntry):
+        """
+        Removes a popped link once it was crawled.
+        """
+        with self._connection:
+            self._connection.execute(
+                "DELETE FROM urls WHERE link_id = ?", (entry.link_id.bytes,)
+            )
+
+    def requeue_leased(self) -> int:
+        """
+        Queues again the links popped by a process that stopped before they were
+        done, returns how many.
+        """
+        with self._connection:
+            self._connection.execute(
+                "UPDATE hosts SET pending = pending + ("
+                "SELECT COUNT(*) FROM urls WHERE host_id = hosts.id AND leased = 1) "
+                "WHERE id IN (SELECT host_id FROM urls WHERE leased = 1)"
+            )
+            cursor = self._connection.execute(
+                "UPDATE urls SET leased = 0 WHERE leased = 1"
+            )
+        return cursor.rowcount
+
+    def pop_ready(self, limit: int) -> list[FrontierEntry]:
+        """
+        Leases the next link of up to limit hosts that may be fetched now, and
+        delays each of these hosts by its crawl delay.
+        """
+        now = time.time()
+        entries = []
+        with self._connection:
+            hosts = self._connection.execute(
+                "SELECT id, name, crawl_delay FROM hosts "
+                "WHERE pending > 0 AND next_fetch_at <= ? "
+                "ORDER BY next_fetch_at LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            for host_id, host, crawl_delay in hosts:
+                seq, priority, link_id = self._connection.execute(
+                    "SELECT seq, priority, link_id FROM urls "
+                    "WHERE host_id = ? AND leased = 0 "
+                    "ORDER BY priority DESC, seq LIMIT 1",
+                    (host_id,),
+                ).fetchone()
+                self._connection.execute(
+                    "UPDATE urls SET leased = 1 WHERE seq = ?", (seq,)
+                )
+                self._connection.execute(
+                    "UPDATE hosts SET pending = pending - 1, next_fetch_at = ? "
+                    "WHERE id = ?",
+                    (now + crawl_delay, host_id),
+                )
+                entries.append(FrontierEntry(host, uuid.UUID(bytes=link_id), priority))
+        return entries
+
+    def next_ready_in(self) -> float | None:
+        """
+        Seconds until a host may be fetched, None when no link is queued.
+        """
+        (next_fetch_at,) = self._connection.execute(
+            "SELECT MIN(next_fetch_at) FROM hosts WHERE pending > 0"
+        ).fetchone()
+        if next_fetch_at is None:
+            return None
+        return max(next_fetch_at - time.time(), 0)
+
+    def get_hosts(self, limit: int) -> list[tuple[str, int, float]]:
+        """
+        Returns the (host, pending links, seconds until ready) of the hosts holding
+        the most links.
+        """
+        now = time.time()
+        rows = self._connection.execute(
+            "SELECT name, pending, next_fetch_at FROM hosts WHERE pending > 0 "
+            "ORDER BY pending DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return [
+            (host, pending, max(next_fetch_at - now, 0))
+            for host, pending, next_fetch_at in rows
+        ]
+
+    def set_priority(self, link_id: uuid.UUID, priority: int) -> bool:
+        """
+        Moves a queued link within its host queue, returns whether it was queued.
+        """
+        with self._connection:
+            cursor = self._connection.execute(
+                "UPDATE urls SET priority = ? WHERE link_id = ? AND leased = 0",
+                (priority, link_id.bytes),
+            )
+        return cursor.rowcount > 0
+
+    def close(self):
+        self._connection.close()
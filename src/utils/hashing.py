@@ -0,0 +1,13 @@
+import hashlib
+import uuid
+
+
+def checksum(text: str) -> str:
+    return hashlib.blake2b(text.encode(errors="replace"), digest_size=16).hexdigest()
+
+
+def url_hash(url: str) -> uuid.UUID:
+    """
+    128-bit key of a canonical URL, equal to md5(url)::uuid in Postgres.
+    """
+    return uuid.UUID(bytes=hashlib.md5(url.encode()).digest())
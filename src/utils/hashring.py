@@ -0,0 +1,49 @@
+import bisect
+import hashlib
+from functools import lru_cache
+
+from src.vars import NUM_SELECTOR_POOLS, POOL_PREFIX, POOL_RING_REPLICAS
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest())
+
+
+class HashRing:
+    """
+    Consistent hash ring of nodes, each placed replicas times on the ring.
+    A key belongs to the first node found clockwise from its hash, so adding or
+    removing a node only moves the keys of about 1 / len(nodes) of the ring.
+    """
+
+    def __init__(self, nodes: list[int], replicas: int = POOL_RING_REPLICAS) -> None:
+        points = sorted(
+            (_hash(f"{node}:{replica}"), node)
+            for node in nodes
+            for replica in range(replicas)
+        )
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def get(self, key: str) -> int:
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._nodes[index]
+
+
+@lru_cache(maxsize=8)
+def get_pool_ring(num_pools: int) -> HashRing:
+    """
+    Returns the ring of the selector pools 1 to num_pools.
+    """
+    return HashRing(list(range(1, num_pools + 1)))
+
+
+def get_pool_queue(
+    domain_name: str, prefix: str = POOL_PREFIX, num_pools: int = NUM_SELECTOR_POOLS
+) -> str:
+    """
+    Every link of a domain goes to the same pool, so that its selector alone
+    enforces the crawl delay of the domain.
+    """
+    pool_index = get_pool_ring(num_pools).get(domain_name)
+    return f"{prefix}{pool_index}"
@@ -1,24 +1,233 @@
+import asyncio
+import os
+import threading
+import weakref
+from collections.abc import Mapping
 from random import randrange
 
+import aiohttp
 import requests
 from requests import adapters
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 
-from src.vars import HTTP_TIMEOUT, USER_AGENTS
+from src.prometheus_exporters import HTTP_POOL_HIT_COUNTER, HTTP_POOL_MISS_COUNTER
+from src.vars import (
+    HTTP_CHUNK_SIZE,
+    HTTP_KEEPALIVE_TIMEOUT,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_CONNECTIONS_PER_HOST,
+    HTTP_POOL_HOSTS,
+    HTTP_TIMEOUT,
+    MAX_CONTENT_BYTES,
+    USER_AGENTS,
+)
+
+worker_id = os.getenv("HOSTNAME", "unknown")
 
 
 def get_user_agent():
     return USER_AGENTS[randrange(1, len(USER_AGENTS))]
 
 
+def is_html(content_type: str | None) -> bool:
+    return content_type is not None and "text/html" in content_type
+
+
+def _count_pool_usage(reused: bool):
+    if reused:
+        HTTP_POOL_HIT_COUNTER.labels(worker_id=worker_id).inc()
+    else:
+        HTTP_POOL_MISS_COUNTER.labels(worker_id=worker_id).inc()
+
+
+class _MeteredHTTPConnectionPool(HTTPConnectionPool):
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout)
+        _count_pool_usage(conn.is_connected)
+        return conn
+
+
+class _MeteredHTTPSConnectionPool(HTTPSConnectionPool):
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout)
+        _count_pool_usage(conn.is_connected)
+        return conn
+
+
+class _MeteredHTTPAdapter(adapters.HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _MeteredHTTPConnectionPool,
+            "https": _MeteredHTTPSConnectionPool,
+        }
+
+
 class HTTPClient:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        max_hosts: int = HTTP_POOL_HOSTS,
+        max_connections_per_host: int = HTTP_MAX_CONNECTIONS_PER_HOST,
+    ) -> None:
         self._session = requests.Session()
         self._session.headers.update({"User-Agent": get_user_agent()})
-        adapter = adapters.HTTPAdapter(
-            pool_connections=10, pool_maxsize=20, max_retries=2
+        # one keep-alive pool per host, blocking when a host already has
+        # max_connections_per_host requests in flight
+        adapter = _MeteredHTTPAdapter(
+            pool_connections=max_hosts,
+            pool_maxsize=max_connections_per_host,
+            pool_block=True,
+            max_retries=2,
         )
         self._session.mount("http://", adapter)
         self._session.mount("https://", adapter)
 
-    def fetch(self, url: str):
-        return self._session.get(url, timeout=HTTP_TIMEOUT)
+    def fetch(self, url: str, headers: Mapping[str, str] | None = None):
+        return self._session.get(url, headers=headers, timeout=HTTP_TIMEOUT)
+
+    def stream(self, url: str, headers: Mapping[str, str] | None = None):
+        """
+        Returns the response before its body is downloaded, res.raw then reads
+        the body with its Content-Encoding decoded. Must be closed by the caller.
+        """
+        res = self._session.get(url, headers=headers, timeout=HTTP_TIMEOUT, stream=True)
+        res.raw.decode_content = True
+        # keeps res.raw readable at EOF when wrapped in io readers
+        res.raw.auto_close = False
+        return res
+
+    def fetch_html(
+        self,
+        url: str,
+        headers: Mapping[str, str] | None = None,
+        max_bytes: int = MAX_CONTENT_BYTES,
+    ) -> tuple[int, Mapping[str, str], str | None]:
+        """
+        Streams url and only downloads its body when it is HTML, up to max_bytes.
+        The text is None when the response is not HTML.
+        """
+        with self._session.get(
+            url, headers=headers, timeout=HTTP_TIMEOUT, stream=True
+        ) as res:
+            content_type = res.headers.get("Content-Type")
+            if not is_html(content_type):
+                return res.status_code, res.headers, None
+
+            body = bytearray()
+            for chunk in res.iter_content(chunk_size=HTTP_CHUNK_SIZE):
+                body += chunk
+                if len(body) >= max_bytes:
+                    break
+            text = _decode(body[:max_bytes], _get_charset(content_type))
+            return res.status_code, res.headers, text
+
+
+class AsyncHTTPClient:
+    """
+    aiohttp counterpart of HTTPClient, must be created inside a running event loop.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        max_connections_per_host: int = HTTP_MAX_CONNECTIONS_PER_HOST,
+    ) -> None:
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_reuseconn.append(self._on_connection_reused)
+        trace_config.on_connection_create_end.append(self._on_connection_created)
+        self._session = aiohttp.ClientSession(
+            headers={"User-Agent": get_user_agent()},
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT),
+            connector=aiohttp.TCPConnector(
+                limit=max_connections,
+                limit_per_host=max_connections_per_host,
+                keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            ),
+            trace_configs=[trace_config],
+        )
+
+    @staticmethod
+    async def _on_connection_reused(session, context, params):
+        _count_pool_usage(True)
+
+    @staticmethod
+    async def _on_connection_created(session, context, params):
+        _count_pool_usage(False)
+
+    async def fetch(self, url: str, headers: Mapping[str, str] | None = None):
+        async with self._session.get(url, headers=headers) as res:
+            text = await res.text(errors="replace")
+            return res.status, res.headers, text
+
+    async def fetch_html(
+        self,
+        url: str,
+        headers: Mapping[str, str] | None = None,
+        max_bytes: int = MAX_CONTENT_BYTES,
+    ) -> tuple[int, Mapping[str, str], str | None]:
+        """
+        Same as HTTPClient.fetch_html.
+        """
+        async with self._session.get(url, headers=headers) as res:
+            if not is_html(res.headers.get("Content-Type")):
+                return res.status, res.headers, None
+
+            body = bytearray()
+            while len(body) < max_bytes:
+                chunk = await res.content.read(
+                    min(HTTP_CHUNK_SIZE, max_bytes - len(body))
+                )
+                if not chunk:
+                    break
+                body += chunk
+            return res.status, res.headers, _decode(body, res.charset or "utf-8")
+
+    async def close(self):
+        await self._session.close()
+
+
+def _get_charset(content_type: str) -> str:
+    for param in content_type.split(";")[1:]:
+        key, _, value = param.partition("=")
+        if key.strip().lower() == "charset":
+            return value.strip().strip("\"'")
+    return "utf-8"
+
+
+def _decode(body: bytes, charset: str) -> str:
+    try:
+        return body.decode(charset, errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+
+_http_client: HTTPClient | None = None
+_http_client_lock = threading.Lock()
+_async_http_clients: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, AsyncHTTPClient
+] = weakref.WeakKeyDictionary()
+
+
+def get_http_client() -> HTTPClient:
+    """
+    Returns the HTTPClient shared by the whole process, so that connections
+    are kept alive across fetches.
+    """
+    global _http_client
+    if _http_client is None:
+        with _http_client_lock:
+            if _http_client is None:
+                _http_client = HTTPClient()
+    return _http_client
+
+
+def get_async_http_client() -> AsyncHTTPClient:
+    """
+    Returns the AsyncHTTPClient shared by the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    http_client = _async_http_clients.get(loop)
+    if http_client is None:
+        http_client = AsyncHTTPClient()
+        _async_http_clients[loop] = http_client
+    return http_client
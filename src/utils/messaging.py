@@ -0,0 +1,247 @@
+import json
+import logging
+import time
+from collections.abc import Callable, Iterable
+from typing import NamedTuple
+
+from pika import BasicProperties, BlockingConnection
+from pika.adapters.blocking_connection import BlockingChannel
+
+from src.vars import (
+    DEFAULT_MESSAGE_BATCH_SIZE,
+    MESSAGE_BATCH_INTERVAL_MS,
+    MESSAGE_BATCH_SIZES,
+    MESSAGE_PREFETCH_COUNT,
+    POOL_PREFIX,
+    POOL_PRIORITIES,
+    PRIORITY_POOL_PREFIX,
+)
+
+logger = logging.getLogger(__name__)
+
+BATCH_CONTENT_TYPE = "application/json"
+
+
+def get_batch_size(queue_name: str) -> int:
+    for prefix in (POOL_PREFIX, PRIORITY_POOL_PREFIX):
+        if queue_name.startswith(prefix):
+            queue_name = prefix
+    return MESSAGE_BATCH_SIZES.get(queue_name, DEFAULT_MESSAGE_BATCH_SIZE)
+
+
+def declare_priority_pool(channel: BlockingChannel, queue_name: str):
+    """
+    Priority pools cannot be declared without their arguments once they exist.
+    """
+    channel.queue_declare(
+        queue=queue_name,
+        arguments={"x-max-priority": max(POOL_PRIORITIES.values())},
+    )
+
+
+def encode_batch(items: Iterable[str]) -> bytes:
+    return json.dumps(list(items)).encode()
+
+
+def decode_batch(body: bytes, content_type: str | None) -> list[str]:
+    """
+    Returns the items of an envelope, or the body itself when it was published as
+    a single item, such as by src.scripts.publish.
+    """
+    if content_type == BATCH_CONTENT_TYPE:
+        return json.loads(body)
+    return [body.decode()]
+
+
+class BatchPublisher:
+    """
+    Buffers items by routing key and message priority, and publishes them as one
+    envelope per batch, once the batch size of the queue is reached or interval
+    seconds have passed.
+    """
+
+    def __init__(
+        self,
+        channel: BlockingChannel,
+        interval: float = MESSAGE_BATCH_INTERVAL_MS / 1000,
+    ) -> None:
+        self._channel = channel
+        self._interval = interval
+        self._pending: dict[tuple[str, int | None], list[str]] = {}
+        self._first_added_at: float | None = None
+
+    def __len__(self) -> int:
+        return sum(len(items) for items in self._pending.values())
+
+    def publish(self, routing_key: str, item: str, priority: int | None = None):
+        key = (routing_key, priority)
+        items = self._pending.setdefault(key, [])
+        items.append(item)
+        if self._first_added_at is None:
+            self._first_added_at = time.monotonic()
+        if len(items) >= get_batch_size(routing_key):
+            self._publish(key, self._pending.pop(key))
+            if len(self._pending) < 1:
+                self._first_added_at = None
+
+    def is_due(self) -> bool:
+        flush_in = self.next_flush_in()
+        return flush_in is not None and flush_in <= 0
+
+    def next_flush_in(self) -> float | None:
+        """
+        Seconds until the pending items are due, None when nothing is pending.
+        """
+        if self._first_added_at is None:
+            return None
+        return max(self._first_added_at + self._interval - time.monotonic(), 0)
+
+    def flush(self):
+        for key, items in self._pending.items():
+            self._publish(key, items)
+        self._pending = {}
+        self._first_added_at = None
+
+    def clear(self):
+        self._pending = {}
+        self._first_added_at = None
+
+    def _publish(self, key: tuple[str, int | None], items: list[str]):
+        routing_key, priority = key
+        self._channel.basic_publish(
+            exchange="",
+            routing_key=routing_key,
+            body=encode_batch(items),
+            properties=BasicProperties(
+                content_type=BATCH_CONTENT_TYPE, priority=priority
+            ),
+        )
+
+
+class ReceivedMessage(NamedTuple):
+    delivery_tag: int
+    redelivered: bool
+    items: list[str]
+
+
+class BatchConsumer:
+    """
+    Consumes queue_name by batches of up to its batch size items, or of whatever was
+    received within interval seconds, and hands each batch to handler.
+    The messages of a batch are only acked once handler returned, handler being
+    expected to have committed its work, and publisher flushed. When handler raised,
+    the messages of the batch are handled one at a time, so that the others are not
+    lost along with a bad one, which is requeued once, then dropped.
+    """
+
+    def __init__(
+        self,
+        connection: BlockingConnection,
+        channel: BlockingChannel,
+        queue_name: str,
+        handler: Callable[[list[str]], None],
+        publisher: BatchPublisher,
+        prefetch_count: int = MESSAGE_PREFETCH_COUNT,
+        interval: float = MESSAGE_BATCH_INTERVAL_MS / 1000,
+    ) -> None:
+        self._connection = connection
+        self._channel = channel
+        self._queue_name = queue_name
+        self._handler = handler
+        self._publisher = publisher
+        self._prefetch_count = prefetch_count
+        self._interval = interval
+        self._batch_size = get_batch_size(queue_name)
+        self._reset()
+
+    def _reset(self):
+        self._messages: list[ReceivedMessage] = []
+        self._size = 0
+        self._first_received_at: float | None = None
+
+    def _on_message(self, ch: BlockingChannel, method, properties, body: bytes):
+        try:
+            items = decode_batch(body, properties.content_type)
+        except Exception as e:
+            logger.critical(
+                f"Could not decode message {body!r} from {self._queue_name}. [{type(e).__name__}]: {e}"
+            )
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            return
+        self._messages.append(
+            ReceivedMessage(method.delivery_tag, method.redelivered, items)
+        )
+        self._size += len(items)
+        if self._first_received_at is None:
+            self._first_received_at = time.monotonic()
+
+    def next_batch_in(self) -> float | None:
+        """
+        Seconds until the current batch is due, None when nothing was received.
+        """
+        if self._first_received_at is None:
+            return None
+        # no more messages are delivered until some are acked
+        if (
+            self._size >= self._batch_size
+            or len(self._messages) >= self._prefetch_count
+        ):
+            return 0
+        return max(self._first_received_at + self._interval - time.monotonic(), 0)
+
+    def _handle(self):
+        messages = self._messages
+        self._reset()
+        try:
+            self._handler([item for message in messages for item in message.items])
+            self._publisher.flush()
+        except Exception as e:
+            self._publisher.clear()
+            logger.error(
+                f"[{type(e).__name__}] - Retrying {len(messages)} messages one at a time inside {self._queue_name} worker due to : {e}"
+            )
+            for message in messages:
+                self._handle_one(message)
+            return
+        self._channel.basic_ack(delivery_tag=messages[-1].delivery_tag, multiple=True)
+
+    def _handle_one(self, message: ReceivedMessage):
+        try:
+            self._handler(message.items)
+            self._publisher.flush()
+        except Exception as e:
+            self._publisher.clear()
+            requeue = not message.redelivered
+            action = "Requeued" if requeue else "Lost"
+            logger.critical(
+                f"[{type(e).__name__}] - {action} {len(message.items)} items inside {self._queue_name} worker due to : {e}"
+            )
+            self._channel.basic_nack(delivery_tag=message.delivery_tag, requeue=requeue)
+            return
+        self._channel.basic_ack(delivery_tag=message.delivery_tag)
+
+    def consume(self):
+        self._channel.basic_qos(prefetch_count=self._prefetch_count)
+        self._channel.basic_consume(
+            queue=self._queue_name, on_message_callback=self._on_message
+        )
+        while True:
+            time_limits = [self.next_batch_in(), self._publisher.next_flush_in()]
+            time_limits = [limit for limit in time_limits if limit is not None]
+            self._connection.process_data_events(
+                time_limit=min(time_limits) if time_limits else None
+            )
+            next_batch_in = self.next_batch_in()
+            if next_batch_in is not None and next_batch_in <= 0:
+                self._handle()
+            if self._publisher.is_due():
+                self._publisher.flush()
+
+    def stop(self):
+        """
+        Hands the batch received so far to handler before stopping.
+        """
+        if len(self._messages) > 0:
+            self._handle()
+        self._publisher.flush()
+        self._channel.stop_consuming()
@@ -1,91 +1,144 @@
 import logging
-import re
+from typing import NamedTuple
+from urllib.parse import urljoin
 
-from bs4 import BeautifulSoup
+from lxml import etree, html
 
+from src.utils.canonicalizer import canonicalize_many
 from src.utils.parsers.urlparser import URLParser
 
 logger = logging.getLogger(__name__)
 
+SEMANTIC_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6", "p"}
+NON_SEMANTIC_TAGS = ("a", "script", "style")
+
+
+class CrawlResult(NamedTuple):
+    title: str | None
+    description: str | None
+    keywords: str | None
+    lang: str | None
+    semantic_content: str | None
+    # every href but anchors, deduplicated in document order
+    raw_hrefs: list[str]
+    # raw_hrefs made absolute against the page URL and its <base href>, canonicalized
+    hrefs: list[str]
+
 
 class CrawlParser:
-    def __init__(self, html: str) -> None:
+    def __init__(self, html: str, base_url: str | None = None) -> None:
         self._html = html
-        self._soup = BeautifulSoup(html, "lxml")
-        self._soup.prettify()
-        for data in self._soup(["style", "script"]):
-            data.decompose()
-        pass
+        self._base_url = base_url
+        self._result: CrawlResult | None = None
 
-    def get_semantic_content(self):
-        body = self._soup.find("body")
-        if body is None:
-            return None
+    def parse(self) -> CrawlResult:
+        """
+        Extracts everything the selector needs in a single walk over the lxml tree.
+        """
+        if self._result is None:
+            self._result = self._extract()
+        return self._result
+
+    def _extract(self) -> CrawlResult:
+        title = None
+        description = None
+        keywords = None
+        lang = None
+        base_href = None
+        has_body = False
+        semantic_tags = []
+        raw_hrefs: dict[str, None] = {}
 
-        semantic_tags = body.find_all(
-            [
-                "h1",
-                "h2",
-                "h3",
-                "h4",
-                "h5",
-                "h6",
-                "p",
-            ]
+        root = self._parse_tree()
+        for element in root.iter() if root is not None else ():
+            tag = element.tag
+            if not isinstance(tag, str):
+                continue
+            if tag == "a":
+                href = element.get("href")
+                if href and not href.startswith("#"):
+                    raw_hrefs[href] = None
+            elif tag in SEMANTIC_TAGS:
+                semantic_tags.append(element)
+            elif tag == "body":
+                has_body = True
+            elif tag == "meta":
+                name = element.get("name")
+                if name == "description_tag" and description is None:
+                    description = element.get("content")
+                elif name == "keywords" and keywords is None:
+                    content = element.get("content")
+                    if content is not None:
+                        keywords = content.replace(", ", ",")
+            elif tag == "title" and title is None:
+                title = element.text_content()
+            elif tag == "html" and lang is None:
+                lang = element.get("lang")
+            elif tag == "base" and base_href is None:
+                base_href = element.get("href")
+
+        semantic_content = None
+        if has_body:
+            semantic_content = "<html><body>"
+            for semantic_tag in semantic_tags:
+                etree.strip_elements(semantic_tag, *NON_SEMANTIC_TAGS, with_tail=False)
+                semantic_content += etree.tostring(
+                    semantic_tag, encoding="unicode", method="html", with_tail=False
+                ).replace("\n", "")
+            semantic_content += "</body></html>"
+
+        return CrawlResult(
+            title=title,
+            description=description,
+            keywords=keywords,
+            lang=lang,
+            semantic_content=semantic_content,
+            raw_hrefs=list(raw_hrefs),
+            hrefs=self._resolve(list(raw_hrefs), base_href),
         )
-        joined_content = "<body>"
-        for semantic_tag in semantic_tags:
-            joined_content += semantic_tag.decode().replace("\n", "")
-        joined_content += "</body>"
-        resoup = BeautifulSoup(joined_content, "lxml")
-        for data in resoup(["a"]):
-            data.decompose()
-        return resoup.decode()
+
+    def _parse_tree(self):
+        if not self._html or self._html.isspace():
+            return None
+        parser = html.HTMLParser(encoding="utf-8", remove_comments=True)
+        return etree.fromstring(
+            self._html.encode("utf-8", errors="replace"), parser=parser
+        )
+
+    def _resolve(self, raw_hrefs: list[str], base_href: str | None) -> list[str]:
+        if self._base_url is None:
+            return []
+        base_url = self._base_url
+        if base_href is not None:
+            try:
+                base_url = urljoin(base_url, base_href)
+            except ValueError:
+                # a malformed <base href> is ignored, as browsers do
+                pass
+        return canonicalize_many(raw_hrefs, base_url)
+
+    def get_semantic_content(self):
+        return self.parse().semantic_content
 
     def get_safe_hrefs(self):
-        hrefs = []
-        a_tags = self._soup.find_all("a", attrs={"href": re.compile(r"^(?!#).+")})
-        for a_tag in a_tags:
-            href = str(a_tag.attrs["href"])
-            url_parser = URLParser(href)
-            pretty_href = url_parser.prettify()
-            if not pretty_href.startswith("http"):
-                continue
-            if pretty_href not in hrefs:
-                hrefs.append(url_parser.prettify())
-        return hrefs
+        hrefs: dict[str, None] = {}
+        for href in self.parse().raw_hrefs:
+            pretty_href = URLParser(href).prettify()
+            if pretty_href.startswith("http"):
+                hrefs[pretty_href] = None
+        return list(hrefs)
 
     def get_unsafe_hrefs(self):
-        hrefs = []
-        a_tags = self._soup.find_all("a", attrs={"href": re.compile(r"^(?!#).+")})
-        for a_tag in a_tags:
-            href = str(a_tag.attrs["href"])
-            if href.startswith("http"):
-                continue
-            if href not in hrefs:
-                hrefs.append(href)
-        return hrefs
+        return [href for href in self.parse().raw_hrefs if not href.startswith("http")]
 
     def get_title(self):
-        title_tag = self._soup.find("title")
-        if title_tag is None:
-            return None
-        return title_tag.text
+        return self.parse().title
 
     def get_description(self):
-        description_tag = self._soup.find("meta", attrs={"name": "description_tag"})
-        if description_tag is None:
-            return None
-        return str(description_tag.attrs["content"])
+        return self.parse().description
 
     def get_keywords(self):
-        keywords_tag = self._soup.find("meta", attrs={"name": "keywords"})
-        if keywords_tag is None:
-            return None
-        return str(keywords_tag.attrs["content"]).replace(", ", ",")
+        return self.parse().keywords
 
     def get_lang(self):
-        html_tag = self._soup.find("html")
-        if html_tag is None:
-            return None
-        return str(html_tag.attrs["lang"])
+        return self.parse().lang
@@ -3,7 +3,7 @@ from functools import lru_cache
 from typing import Optional
 from urllib.robotparser import RobotFileParser
 
-from src.utils.httpclient import HTTPClient, get_user_agent
+from src.utils.httpclient import get_http_client, get_user_agent
 from src.vars import DEFAULT_CRAWL_DELAY
 
 logger = logging.getLogger(__name__)
@@ -13,8 +13,7 @@ logger = logging.getLogger(__name__)
 def get_robot_parser(domain_name: str, protocol: str) -> Optional[RobotFileParser]:
     try:
         robots_url = f"{protocol}://{domain_name}/robots.txt"
-        http_client = HTTPClient()
-        res = http_client.fetch(robots_url)
+        res = get_http_client().fetch(robots_url)
     except Exception as e:
         logger.error(f"Fetching {robots_url} resulted in [{type(e).__name__}]: {e}")
         return None
@@ -1,61 +1,103 @@
+import gzip
+import io
 import logging
+from collections.abc import Iterator
+from typing import BinaryIO, NamedTuple
 
-from bs4 import BeautifulSoup, Tag
+from lxml import etree
 
-from src.models.Link import ChangeFreq, Link
+from src.models.Link import ChangeFreq
 from src.utils.math import normalize_priority
 
 logger = logging.getLogger(__name__)
 
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+class SitemapEntry(NamedTuple):
+    loc: str
+    # True for the <sitemap> entries of a sitemap index
+    is_index: bool = False
+    priority: float = 0.5
+    change_freq: ChangeFreq = ChangeFreq.MONTHLY
+
+
+def open_sitemap(raw: BinaryIO) -> BinaryIO:
+    """
+    Wraps a raw sitemap stream, decompressing it on the fly when it is gzipped.
+    """
+    buffered = io.BufferedReader(raw)
+    if buffered.peek(len(GZIP_MAGIC))[: len(GZIP_MAGIC)] == GZIP_MAGIC:
+        return gzip.GzipFile(fileobj=buffered)
+    return buffered
+
 
 class SitemapParser:
-    def __init__(self, sitemap_xml: str) -> None:
-        self._soup = BeautifulSoup(sitemap_xml, "xml")
-        pass
-
-    def _process_index(self, index_tag: Tag):
-        url_list = []
-        sitemaps = index_tag.find_all("sitemap")
-        for sitemap in sitemaps:
-            url = sitemap.find("loc")
-            if url is not None and not url.text.endswith(".gz"):
-                url_list.append(url.text)
-        return url_list
-
-    def _process_urlset(self, urlset_tag: Tag) -> list[Link]:
-        link_list = []
-        urls = urlset_tag.find_all("url")
-        for url in urls:
-            loc = url.find("loc")
-            if loc is None:
+    def __init__(self, source: BinaryIO) -> None:
+        self._source = source
+
+    def _process_index(self, sitemap_tag: etree._Element) -> SitemapEntry | None:
+        for child in sitemap_tag:
+            if etree.QName(child).localname == "loc" and child.text:
+                return SitemapEntry(loc=child.text.strip(), is_index=True)
+        return None
+
+    def _process_url(self, url_tag: etree._Element) -> SitemapEntry | None:
+        loc = None
+        priority = 0.5
+        changefreq = ChangeFreq.MONTHLY
+        for child in url_tag:
+            if not isinstance(child.tag, str) or not child.text:
                 continue
-            # ? priority_tag = url.find('priority')?.text ?? 0.5
-            priority_tag = url.find("priority")
-            priority = 0.5
-            if priority_tag is not None:
-                priority = normalize_priority(float(priority_tag.text))
-            changefreq_tag = url.find("changefreq")
-            changefreq = ChangeFreq.MONTHLY
-            if changefreq_tag is not None:
+            name = etree.QName(child).localname
+            text = child.text.strip()
+            if name == "loc":
+                loc = text
+            elif name == "priority":
+                try:
+                    priority = normalize_priority(float(text))
+                except ValueError:
+                    logger.error(f"{text} is not a valid priority.")
+            elif name == "changefreq":
                 try:
-                    changefreq = ChangeFreq(changefreq_tag.text.lower())
-                except Exception:
-                    logger.error(f"{changefreq_tag.text} is not a valid ChangeFreq.")
-            link = Link(url=loc.text, priority=priority, change_freq=changefreq)
-            link_list.append(link)
-        return link_list
-
-    def get_indexes(self) -> list[str]:
-        url_list = []
-
-        indexes = self._soup.find_all("sitemapindex")
-        for index in indexes:
-            url_list.extend(self._process_index(index))
-        return url_list
-
-    def get_links(self) -> list[Link]:
-        link_list = []
-        urlsets = self._soup.find_all("urlset")
-        for urlset in urlsets:
-            link_list.extend(self._process_urlset(urlset))
-        return link_list
+                    changefreq = ChangeFreq(text.lower())
+                except ValueError:
+                    logger.error(f"{text} is not a valid ChangeFreq.")
+        if loc is None:
+            return None
+        return SitemapEntry(loc=loc, priority=priority, change_freq=changefreq)
+
+    def iter_entries(self) -> Iterator[SitemapEntry]:
+        """
+        Yields the entries of the sitemap as they are parsed, dropping every
+        parsed element so memory stays flat whatever the sitemap size.
+        """
+        context = etree.iterparse(
+            self._source,
+            events=("end",),
+            tag=("{*}url", "{*}sitemap"),
+            recover=True,
+            resolve_entities=False,
+            no_network=True,
+            huge_tree=True,
+        )
+        for _, element in context:
+            if etree.QName(element).localname == "sitemap":
+                entry = self._process_index(element)
+            else:
+                entry = self._process_url(element)
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+            if entry is not None:
+                yield entry
+
+    def iter_batches(self, batch_size: int) -> Iterator[list[SitemapEntry]]:
+        batch = []
+        for entry in self.iter_entries():
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
@@ -1,6 +1,8 @@
 import logging
 from urllib.parse import urlparse
 
+from src.utils.canonicalizer import canonicalize
+
 logger = logging.getLogger(__name__)
 
 
@@ -20,10 +22,7 @@ class URLParser:
         return hostname
 
     def prettify(self):
-        hostname = self.get_domain()
-        final_url = f"{self._parsed_url.scheme}://{hostname}"
-        path = self._parsed_url.path
-        if path.endswith("/"):
-            path = path[:-1]
-        final_url += path
-        return final_url
+        """
+        Returns the canonical form of the URL, see src.utils.canonicalizer.
+        """
+        return canonicalize(self._raw_url) or self._raw_url
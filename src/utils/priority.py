@@ -0,0 +1,25 @@
+from src.models.Link import ChangeFreq, Link
+
+
+def get_priority(link: Link) -> str | None:
+    """
+    Returns "high", "medium" or "low", or None when link is never to be crawled.
+    """
+    if link.change_freq == ChangeFreq.NEVER:
+        return None
+    if link.change_freq in [ChangeFreq.YEARLY, ChangeFreq.MONTHLY]:
+        return "low"
+    elif link.change_freq in [ChangeFreq.WEEKLY]:
+        return "medium"
+    if link.priority >= 0.7:
+        return "high"
+    elif link.priority >= 0.5:
+        return "medium"
+    return "low"
+
+
+def get_priority_queue(link: Link) -> str | None:
+    priority = get_priority(link)
+    if priority is None:
+        return None
+    return f"{priority}_priority_links"
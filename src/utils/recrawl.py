@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+from src.models.Link import ChangeFreq, Link
+from src.vars import (
+    RECRAWL_CHANGED_FACTOR,
+    RECRAWL_INTERVALS,
+    RECRAWL_MAX_DRIFT,
+    RECRAWL_MIN_INTERVAL,
+    RECRAWL_UNCHANGED_FACTOR,
+)
+
+
+def get_recrawl_interval(
+    change_freq: ChangeFreq, previous_interval: float | None, changed: bool
+) -> float | None:
+    """
+    Returns the estimated seconds between two changes of a page, starting from its
+    declared change_freq and halved or grown by every crawl depending on whether
+    its content changed. None when the page is never to be crawled again.
+    """
+    declared_interval = RECRAWL_INTERVALS[change_freq.name]
+    if declared_interval is None:
+        return None
+    if previous_interval is None:
+        return declared_interval
+
+    factor = RECRAWL_CHANGED_FACTOR if changed else RECRAWL_UNCHANGED_FACTOR
+    interval = previous_interval * factor
+    min_interval = max(declared_interval / RECRAWL_MAX_DRIFT, RECRAWL_MIN_INTERVAL)
+    max_interval = declared_interval * RECRAWL_MAX_DRIFT
+    return min(max(interval, min_interval), max_interval)
+
+
+def schedule_recrawl(link: Link, changed: bool):
+    """
+    Sets when link, just crawled, is due again. Links of a higher priority are
+    crawled up to twice as often.
+    """
+    link.recrawl_interval = get_recrawl_interval(
+        link.change_freq, link.recrawl_interval, changed
+    )
+    if link.recrawl_interval is None:
+        link.next_crawl_at = None
+        return
+    priority = min(max(link.priority, 0), 1)
+    wait = link.recrawl_interval * (1.5 - priority)
+    link.next_crawl_at = datetime.now() + timedelta(seconds=wait)
@@ -0,0 +1,115 @@
+import heapq
+import time
+from collections import deque
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class PolitenessScheduler(Generic[T]):
+    """
+    Holds pending items in one ready queue per host, and a min-heap of the next
+    time each host may be fetched. pop() only ever returns an item whose host
+    has waited its crawl delay, so one slow host never blocks the others.
+    With max_backlog, a host holds no more items than it can fetch in about
+    max_backlog seconds.
+    """
+
+    def __init__(self, max_backlog: float | None = None) -> None:
+        self._max_backlog = max_backlog
+        self._ready_queues: dict[str, deque[T]] = {}
+        self._next_fetch_at: dict[str, float] = {}
+        self._crawl_delays: dict[str, float] = {}
+        # (next_fetch_at, host), entries that no longer match _next_fetch_at are stale
+        self._heap: list[tuple[float, str]] = []
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def push(self, host: str, item: T, crawl_delay: float, wait: float = 0) -> bool:
+        """
+        Returns False, leaving item out, when its host already holds max_backlog
+        seconds of pending items.
+        """
+        if self._max_backlog is not None and host in self._ready_queues:
+            waited = self._next_fetch_at[host] - time.monotonic()
+            backlog = waited + len(self._ready_queues[host]) * crawl_delay
+            if backlog > self._max_backlog:
+                return False
+        self._crawl_delays[host] = crawl_delay
+        self._enqueue(host, wait).append(item)
+        self._size += 1
+        return True
+
+    def retry(self, host: str, item: T, wait: float):
+        """
+        Puts back an item that could not be fetched yet in front of its host queue.
+        """
+        self._enqueue(host, wait).appendleft(item)
+        self._size += 1
+
+    def pop(self) -> tuple[str, T] | None:
+        now = time.monotonic()
+        host = self._peek()
+        if host is None or self._next_fetch_at[host] > now:
+            return None
+
+        heapq.heappop(self._heap)
+        queue = self._ready_queues[host]
+        item = queue.popleft()
+        self._size -= 1
+        next_fetch_at = now + self._crawl_delays.get(host, 0)
+        self._next_fetch_at[host] = next_fetch_at
+        if queue:
+            heapq.heappush(self._heap, (next_fetch_at, host))
+        else:
+            del self._ready_queues[host]
+        return host, item
+
+    def next_ready_in(self) -> float | None:
+        """
+        Seconds until pop() can return an item, None when nothing is pending.
+        """
+        host = self._peek()
+        if host is None:
+            return None
+        return max(self._next_fetch_at[host] - time.monotonic(), 0)
+
+    def _enqueue(self, host: str, wait: float) -> deque[T]:
+        now = time.monotonic()
+        current = self._next_fetch_at.get(host)
+        next_fetch_at = now + wait
+        if current is not None and current > next_fetch_at:
+            next_fetch_at = current
+
+        queue = self._ready_queues.get(host)
+        if queue is None:
+            queue = deque()
+            self._ready_queues[host] = queue
+            self._forget_idle_hosts(now)
+            heapq.heappush(self._heap, (next_fetch_at, host))
+        elif next_fetch_at != current:
+            heapq.heappush(self._heap, (next_fetch_at, host))
+        self._next_fetch_at[host] = next_fetch_at
+        return queue
+
+    def _peek(self) -> str | None:
+        while self._heap:
+            next_fetch_at, host = self._heap[0]
+            if (
+                host in self._ready_queues
+                and self._next_fetch_at[host] == next_fetch_at
+            ):
+                return host
+            heapq.heappop(self._heap)
+        return None
+
+    def _forget_idle_hosts(self, now: float):
+        # hosts without pending items only matter until their delay has elapsed
+        if len(self._next_fetch_at) < 2 * len(self._ready_queues) + 1024:
+            return
+        for host, next_fetch_at in list(self._next_fetch_at.items()):
+            if host not in self._ready_queues and next_fetch_at <= now:
+                del self._next_fetch_at[host]
+                self._crawl_delays.pop(host, None)
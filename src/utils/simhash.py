@@ -0,0 +1,65 @@
+import hashlib
+import re
+from collections import Counter
+
+TOKEN_PATTERN = re.compile(r"\w+")
+FINGERPRINT_BITS = 64
+
+
+def simhash(text: str, shingle_size: int = 3, min_tokens: int = 0) -> int | None:
+    """
+    Returns the 64-bit SimHash of text over its word shingles, each weighted by its
+    number of occurrences, so that near-identical texts get fingerprints at a small
+    Hamming distance. None when text has fewer than min_tokens words.
+    """
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    if len(tokens) < max(min_tokens, 1):
+        return None
+    shingles = Counter(
+        " ".join(tokens[i : i + shingle_size])
+        for i in range(max(len(tokens) - shingle_size + 1, 1))
+    )
+    # counts of every byte value at every byte of the hashes, the weight of a bit
+    # being then summed over 256 values instead of over every shingle
+    num_bytes = FINGERPRINT_BITS // 8
+    byte_counts = [[0] * 256 for _ in range(num_bytes)]
+    for shingle, count in shingles.items():
+        digest = hashlib.blake2b(shingle.encode(), digest_size=num_bytes).digest()
+        for index, value in enumerate(digest):
+            byte_counts[index][value] += count
+
+    total = shingles.total()
+    fingerprint = 0
+    for index, counts in enumerate(byte_counts):
+        for bit in range(8):
+            ones = sum(counts[value] for value in range(256) if value >> bit & 1)
+            if 2 * ones > total:
+                fingerprint |= 1 << ((num_bytes - 1 - index) * 8 + bit)
+    return fingerprint
+
+
+def get_bands(fingerprint: int, num_bands: int) -> list[int]:
+    """
+    Splits fingerprint into num_bands values of consecutive bits. Two fingerprints
+    within num_bands - 1 bits of each other share at least one band.
+    """
+    band_bits = FINGERPRINT_BITS // num_bands
+    mask = (1 << band_bits) - 1
+    return [fingerprint >> (band * band_bits) & mask for band in range(num_bands)]
+
+
+def hamming_distance(first: int, second: int) -> int:
+    return (first ^ second).bit_count()
+
+
+def to_signed(fingerprint: int) -> int:
+    """
+    Fingerprint as stored in a BIGINT column.
+    """
+    if fingerprint >= 1 << (FINGERPRINT_BITS - 1):
+        return fingerprint - (1 << FINGERPRINT_BITS)
+    return fingerprint
+
+
+def to_unsigned(value: int) -> int:
+    return value & ((1 << FINGERPRINT_BITS) - 1)
@@ -14,6 +14,11 @@ USER_AGENTS = [
     "Mozilla/5.0 (Linux; Android 14; SM-S911B) AppleWebKit/537.36 (KHTML, like Gecko) SamsungBrowser/26.0 Chrome/122.0.0.0 Mobile Safari/537.36",
 ]
 HTTP_TIMEOUT = 5
+HTTP_MAX_CONNECTIONS = 500
+HTTP_MAX_CONNECTIONS_PER_HOST = 2
+HTTP_POOL_HOSTS = 100
+HTTP_KEEPALIVE_TIMEOUT = 30
+HTTP_CHUNK_SIZE = 64 * 1024
 DEFAULT_CRAWL_DELAY = 5
 # queue workers
 QUEUES = [
@@ -25,8 +30,108 @@ QUEUES = [
     "low_priority",
 ]
 POOL_PREFIX = "links_pool_"
+# one selector per pool, links are routed to pools by domain on a hash ring,
+# see src.scripts.rebalance_pools when changing it
+NUM_SELECTOR_POOLS = 5
+POOL_RING_REPLICAS = 100
+# pools fed by links workers started with --dispatch, ordered by the broker
+PRIORITY_POOL_PREFIX = "priority_links_pool_"
+POOL_PRIORITIES = {"low": 0, "medium": 1, "high": 2}
+SELECTOR_CONCURRENCY = 200
+SELECTOR_PREFETCH = 1000
+# seconds of crawl delays a domain may have pending in a selector, links beyond
+# are published back to their pool so that messages are acked well before
+# RabbitMQ's consumer_timeout
+SELECTOR_MAX_HOST_BACKLOG = 600
+# seconds before a link whose crawl failed is crawled again, once
+SELECTOR_RETRY_WAIT = 60
+# selectors started with --frontier keep their pending links on local disk
+FRONTIER_DIRECTORY = "frontier"
+FRONTIER_BATCH_SIZE = 100
+# message envelopes, in items per published message and per consumed batch
+MESSAGE_BATCH_SIZES = {
+    "domains": 20,
+    "sitemaps": 1,
+    "links": 200,
+    "prioritizer": 500,
+    "low_priority_links": 500,
+    "medium_priority_links": 500,
+    "high_priority_links": 500,
+    POOL_PREFIX: 20,
+    PRIORITY_POOL_PREFIX: 20,
+}
+DEFAULT_MESSAGE_BATCH_SIZE = 100
+MESSAGE_BATCH_INTERVAL_MS = 500
+# in messages, each holding up to the batch size of its queue
+MESSAGE_PREFETCH_COUNT = 50
+# recrawler, in seconds between two crawls by declared change_freq, None for never
+RECRAWL_INTERVALS: dict[str, int | None] = {
+    "ALWAYS": 3600,
+    "HOURLY": 3600,
+    "DAILY": 24 * 3600,
+    "WEEKLY": 7 * 24 * 3600,
+    "MONTHLY": 30 * 24 * 3600,
+    "YEARLY": 365 * 24 * 3600,
+    "NEVER": None,
+}
+# the observed interval shrinks when the content changed and grows when it did not,
+# staying within RECRAWL_MAX_DRIFT times the declared one
+RECRAWL_CHANGED_FACTOR = 0.5
+RECRAWL_UNCHANGED_FACTOR = 1.5
+RECRAWL_MAX_DRIFT = 8
+RECRAWL_MIN_INTERVAL = 3600
+RECRAWL_BATCH_SIZE = 5000
+RECRAWL_SCAN_SIZE = 50_000
+RECRAWL_PER_DOMAIN = 20
+# due links are pushed back by the lease when published, until they are crawled
+RECRAWL_LEASE = 6 * 3600
+RECRAWL_PERIOD = 60
+# near-duplicate pages, within SIMHASH_MAX_DISTANCE bits of an indexed one, are
+# neither stored nor expanded. SIMHASH_BANDS must be above SIMHASH_MAX_DISTANCE
+SIMHASH_SHINGLE_SIZE = 3
+SIMHASH_MIN_TOKENS = 50
+SIMHASH_BANDS = 4
+SIMHASH_MAX_DISTANCE = 3
+# outlinks dropped by the selectors, see src.utils.crawlbudget
+CRAWL_BUDGET_MAX_PAGES = 100_000
+CRAWL_BUDGET_MAX_DEPTH = 12
+CRAWL_BUDGET_MAX_REPEATS = 2
+CRAWL_BUDGET_MAX_QUERY_PATTERNS = 20
+CRAWL_BUDGET_MAX_TEMPLATES = 100_000
 # others
 MAX_CONTENT_CHARS = 100_000
+MAX_CONTENT_BYTES = 2_000_000
+SITEMAP_BATCH_SIZE = 5000
+CONTENT_COMPRESSION_LEVEL = 3
+DOMAIN_CACHE_SIZE = 10_000
+DOMAIN_CACHE_TTL = 300
+WRITE_BEHIND_MAX_ROWS = 500
+WRITE_BEHIND_INTERVAL_MS = 1000
+# url-seen filter, shared by the workers of a host through URL_FILTER_PATH,
+# or held by each process when None
+URL_FILTER_CAPACITY = 50_000_000
+URL_FILTER_ERROR_RATE = 0.01
+URL_FILTER_PATH: str | None = "/tmp/url_filter.bloom"
+# url canonicalization, URL_QUERY_POLICY is one of "keep", "strip", "sort" or "drop"
+URL_QUERY_POLICY = "sort"
+URL_CANONICAL_CACHE_SIZE = 100_000
+URL_ORIGIN_CACHE_SIZE = 10_000
+TRACKING_PARAMETERS = {
+    "fbclid",
+    "gclid",
+    "dclid",
+    "msclkid",
+    "yclid",
+    "igshid",
+    "mc_cid",
+    "mc_eid",
+    "_ga",
+    "_gl",
+    "ref_src",
+    "jsessionid",
+    "phpsessid",
+    "sessionid",
+}
 WHITELISTED_DOMAINS = [
     "*.wikipedia.org",
     "*.reddit.com",
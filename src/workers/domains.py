@@ -4,7 +4,6 @@ from datetime import datetime
 from urllib.parse import urlparse
 
 from pika import BlockingConnection, ConnectionParameters, PlainCredentials
-from pika.adapters.blocking_connection import BlockingChannel
 from prometheus_client import start_http_server
 from sqlalchemy.orm import Session
 
@@ -16,6 +15,7 @@ from src.prometheus_exporters import (
     REQUEST_TIME,
 )
 from src.repositories.DomainRepository import DomainRepository
+from src.utils.messaging import BatchConsumer, BatchPublisher
 from src.utils.parsers.robotsparser import (
     get_crawl_delay,
     get_robot_parser,
@@ -26,7 +26,7 @@ logger = logging.getLogger(__name__)
 
 
 @REQUEST_TIME.time()
-def process(new_domain_url: str, session: Session, channel: BlockingChannel) -> bool:
+def process(new_domain_url: str, session: Session, publisher: BatchPublisher) -> bool:
     was_added = False
     with session.begin():
         domain_repo = DomainRepository(session)
@@ -43,11 +43,10 @@ def process(new_domain_url: str, session: Session, channel: BlockingChannel) ->
 
         if domain.last_crawled_at is None:
             was_added = True
+        domain_repo.invalidate(domain)
         domain.last_processed_at = datetime.now()
         domain.crawl_delay = get_crawl_delay(domain.name, domain.protocol)
-        channel.basic_publish(
-            exchange="", routing_key="links", body=f"{domain.protocol}://{domain.name}"
-        )
+        publisher.publish("links", f"{domain.protocol}://{domain.name}")
         robot_parser = get_robot_parser(domain.name, domain.protocol)
         if robot_parser is None:
             domain.has_robots_txt = False
@@ -55,7 +54,7 @@ def process(new_domain_url: str, session: Session, channel: BlockingChannel) ->
 
         domain.has_robots_txt = True
         for sitemap_url in get_sitemaps(domain.name, domain.protocol):
-            channel.basic_publish(exchange="", routing_key="sitemaps", body=sitemap_url)
+            publisher.publish("sitemaps", sitemap_url)
         return was_added
 
 
@@ -81,32 +80,34 @@ def main():
     channel.queue_declare(queue="domains")
     channel.queue_declare(queue="sitemaps")
 
-    def work(ch, method, properties, body: bytes):
-        domain_name = body.decode()
-        print(f" [domains] [{worker_id}] Processing {domain_name}")
-        ch.basic_ack(delivery_tag=method.delivery_tag)
-        try:
-            with Session(engine) as session:
-                was_added = process(domain_name, session, channel)
-                if was_added:
-                    DOMAIN_ADDED_COUNTER.labels(worker_id=worker_id).inc()
-                DOMAIN_PROCESSED_COUNTER.labels(worker_id=worker_id).inc()
-            print(f" [domains] [{worker_id}] Processed {domain_name}")
-        except Exception as e:
-            logger.critical(
-                f"[{type(e).__name__}] - Lost {domain_name} inside a domains worker due to : {e}"
-            )
-
-    channel.basic_consume(queue="domains", on_message_callback=work)
+    publisher = BatchPublisher(channel)
+
+    def work(domain_names: list[str]):
+        # domains are fetched one by one, a failure only loses its own domain
+        for domain_name in domain_names:
+            print(f" [domains] [{worker_id}] Processing {domain_name}")
+            try:
+                with Session(engine) as session:
+                    was_added = process(domain_name, session, publisher)
+                    if was_added:
+                        DOMAIN_ADDED_COUNTER.labels(worker_id=worker_id).inc()
+                    DOMAIN_PROCESSED_COUNTER.labels(worker_id=worker_id).inc()
+                print(f" [domains] [{worker_id}] Processed {domain_name}")
+            except Exception as e:
+                logger.critical(
+                    f"[{type(e).__name__}] - Lost {domain_name} inside a domains worker due to : {e}"
+                )
+
+    consumer = BatchConsumer(connection, channel, "domains", work, publisher)
 
     try:
-        channel.start_consuming()
         print(
             f" [domains] [{worker_id}] Waiting for domains to process. Press CTRL+C to exit"
         )
+        consumer.consume()
     except KeyboardInterrupt:
         print("Shutting down worker...")
-        channel.stop_consuming()
+        consumer.stop()
         connection.close()
     except Exception as e:
         logger.critical(
@@ -1,60 +1,141 @@
 import logging
 import os
-from datetime import datetime
+from argparse import ArgumentParser
+from collections import Counter
+from collections.abc import Iterable
 
 from pika import BlockingConnection, ConnectionParameters, PlainCredentials
-from pika.adapters.blocking_connection import BlockingChannel
 from prometheus_client import start_http_server
 from sqlalchemy.orm import Session
 
 from src.database.engine import engine
-from src.models.Domain import Domain
-from src.models.Link import Link
+from src.database.urlfilter import get_url_filter
 from src.prometheus_exporters import LINK_ADDED_COUNTER
-from src.repositories.DomainRepository import DomainRepository
+from src.repositories.DomainRepository import DomainRepository, get_domains
 from src.repositories.LinkRepository import LinkRepository
+from src.utils.bloomfilter import BloomFilter
+from src.utils.hashring import get_pool_queue
+from src.utils.messaging import (
+    BatchConsumer,
+    BatchPublisher,
+    declare_priority_pool,
+)
 from src.utils.parsers.robotsparser import is_allowed
 from src.utils.parsers.urlparser import URLParser
+from src.utils.priority import get_priority
+from src.vars import NUM_SELECTOR_POOLS, POOL_PRIORITIES, PRIORITY_POOL_PREFIX
 
 logger = logging.getLogger(__name__)
 
 
-def process(link_url: str, session: Session, channel: BlockingChannel):
+def prettify_urls(link_urls: Iterable[str]) -> list[str]:
+    """
+    Returns the canonical form of the urls that fit in the links table, leaving out
+    those that cannot be parsed so that they do not fail the whole batch.
+    """
+    pretty_urls = []
+    for link_url in link_urls:
+        try:
+            url = URLParser(link_url).prettify()
+            URLParser(url).get_domain()
+        except ValueError as e:
+            logger.error(f"Could not parse URL {link_url}. [{type(e).__name__}]: {e}")
+            continue
+        if len(url) <= 512:
+            pretty_urls.append(url)
+    return pretty_urls
+
+
+def process(
+    link_urls: list[str],
+    session: Session,
+    publisher: BatchPublisher,
+    dispatch: bool = False,
+    url_filter: BloomFilter | None = None,
+):
+    """
+    Inserts the links that are not known yet along with their domains, in a single
+    transaction, and forwards the links that may be crawled to the prioritizer.
+    With dispatch, they are prioritized here and published straight to the priority
+    pools instead, skipping the prioritizer and router hops.
+    """
     worker_id = os.getenv("HOSTNAME", "unknown")
 
+    domain_names, domains = get_domains(prettify_urls(link_urls))
+    # robots.txt is fetched before the transaction, which would otherwise hold the
+    # locks of the inserted rows meanwhile
+    allowed_domain_names = {
+        domain.name for domain in domains if is_allowed(domain.name, domain.protocol)
+    }
+
     with session.begin():
-        url_parser = URLParser(link_url)
-        domain_name = url_parser.get_domain()
         domain_repo = DomainRepository(session)
-        domain = domain_repo.find_one_by_name(domain_name)
-        is_new_domain = False
-        if domain is None:
-            domain = Domain(name=domain_name, protocol=url_parser.get_scheme())
-            domain = domain_repo.upsert_one(domain)
-            if domain is None:
-                logger.critical(f"Could not upsert domain : {domain_name}.")
-                return
-            is_new_domain = True
-
-        if is_new_domain and domain is not None:
-            channel.basic_publish(exchange="", routing_key="domains", body=domain.name)
-
+        domain_ids, new_domain_names = domain_repo.upsert_many(domains)
         link_repo = LinkRepository(session)
-        pretty_link_url = url_parser.prettify()
-        link = link_repo.find_one_by_url(pretty_link_url)
-        if link is None:
-            link = Link(url=pretty_link_url)
-            link_repo.insert_one(link)
-            LINK_ADDED_COUNTER.labels(worker_id=worker_id).inc()
-
-        if not is_allowed(domain.name, domain.protocol):
-            link.last_crawled_at = datetime.now()
-            return
-
-        channel.basic_publish(exchange="", routing_key="prioritizer", body=str(link.id))
+        ids, new_urls = link_repo.upsert_many(
+            [
+                {"url": url, "domain_id": domain_ids[domain_name]}
+                for url, domain_name in domain_names.items()
+            ],
+            url_filter,
+        )
+        domain_repo.add_link_counts(
+            Counter(domain_ids[domain_names[url]] for url in new_urls)
+        )
+        # links discovered before domain_id existed
+        inserted_urls = set(new_urls)
+        link_repo.fill_domain_ids(
+            {
+                ids[url]: domain_ids[domain_name]
+                for url, domain_name in domain_names.items()
+                if url not in inserted_urls
+            }
+        )
+        link_repo.mark_crawled_many(
+            ids[url]
+            for url, domain_name in domain_names.items()
+            if domain_name not in allowed_domain_names
+        )
+        allowed_ids = [
+            ids[url]
+            for url, domain_name in domain_names.items()
+            if domain_name in allowed_domain_names
+        ]
+        priorities = {}
+        if dispatch:
+            links = link_repo.read_many(allowed_ids)
+            priorities = {link.id: get_priority(link) for link in links}
+    LINK_ADDED_COUNTER.labels(worker_id=worker_id).inc(len(new_urls))
+
+    for domain_name in new_domain_names:
+        publisher.publish("domains", domain_name)
+    if not dispatch:
+        for link_id in allowed_ids:
+            publisher.publish("prioritizer", str(link_id))
+        return
+    link_domain_names = {ids[url]: name for url, name in domain_names.items()}
+    for link_id, priority in priorities.items():
+        if priority is not None:
+            queue_name = get_pool_queue(
+                link_domain_names[link_id], PRIORITY_POOL_PREFIX
+            )
+            publisher.publish(queue_name, str(link_id), POOL_PRIORITIES[priority])
 
 
 def main():
+    arg_parser = ArgumentParser()
+    arg_parser.add_argument(
+        "--dispatch",
+        help="Publish links to the priority pools instead of the prioritizer.",
+        action="store_true",
+    )
+    arg_parser.add_argument(
+        "--url-filter",
+        help="Look up only the links a url-seen filter may have seen before inserting them.",
+        action="store_true",
+    )
+    args = arg_parser.parse_args()
+
     worker_id = os.getenv("HOSTNAME", "unknown")
     metrics_port = int(os.getenv("METRICS_PORT", "8000"))
 
@@ -76,29 +157,28 @@ def main():
     channel.queue_declare(queue="links")
     channel.queue_declare(queue="domains")
     channel.queue_declare(queue="prioritizer")
+    if args.dispatch:
+        for i in range(1, NUM_SELECTOR_POOLS + 1):
+            declare_priority_pool(channel, f"{PRIORITY_POOL_PREFIX}{i}")
 
-    def work(ch, method, properties, body: bytes):
-        link_url = body.decode()
-        print(f" [links] [{worker_id}] Processing link {link_url}")
-        ch.basic_ack(delivery_tag=method.delivery_tag)
-        try:
-            with Session(engine) as session:
-                process(link_url, session, channel)
-        except Exception as e:
-            logger.critical(
-                f"[{type(e).__name__}] - Lost {link_url} inside a links worker due to : {e}"
-            )
+    publisher = BatchPublisher(channel)
+    url_filter = get_url_filter() if args.url_filter else None
+
+    def work(link_urls: list[str]):
+        print(f" [links] [{worker_id}] Processing {len(link_urls)} links")
+        with Session(engine) as session:
+            process(link_urls, session, publisher, args.dispatch, url_filter)
 
-    channel.basic_consume(queue="links", on_message_callback=work)
+    consumer = BatchConsumer(connection, channel, "links", work, publisher)
 
     try:
         print(
             f" [links] [{worker_id}] Waiting for links to process. To exit press CTRL+C"
         )
-        channel.start_consuming()
+        consumer.consume()
     except KeyboardInterrupt:
         print("Shutting down worker...")
-        channel.stop_consuming()
+        consumer.stop()
         connection.close()
     except Exception as e:
         logger.critical(
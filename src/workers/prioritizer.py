@@ -3,49 +3,26 @@ import os
 import uuid
 
 from pika import BlockingConnection, ConnectionParameters
-from pika.adapters.blocking_connection import BlockingChannel
 from prometheus_client import start_http_server
 from sqlalchemy.orm import Session
 
 from src.database.engine import engine
-from src.models.Link import ChangeFreq
 from src.repositories.LinkRepository import LinkRepository
+from src.utils.messaging import BatchConsumer, BatchPublisher
+from src.utils.priority import get_priority_queue
 
 logger = logging.getLogger(__name__)
 
 
-def process(link_id: uuid.UUID, session: Session, channel: BlockingChannel):
+def process(link_ids: list[uuid.UUID], session: Session, publisher: BatchPublisher):
     with session.begin():
         link_repo = LinkRepository(session)
-        link = link_repo.read_one(link_id)
-        if link is None:
-            return
-        if link.change_freq == ChangeFreq.NEVER:
-            return
-        if link.change_freq in [ChangeFreq.YEARLY, ChangeFreq.MONTHLY]:
-            channel.basic_publish(
-                exchange="", routing_key="low_priority_links", body=str(link.id)
-            )
-            return
-        elif link.change_freq in [ChangeFreq.WEEKLY]:
-            channel.basic_publish(
-                exchange="", routing_key="medium_priority_links", body=str(link.id)
-            )
-            return
-        if link.priority >= 0.7:
-            channel.basic_publish(
-                exchange="", routing_key="high_priority_links", body=str(link.id)
-            )
-            return
-        elif link.priority >= 0.5:
-            channel.basic_publish(
-                exchange="", routing_key="medium_priority_links", body=str(link.id)
-            )
-            return
-        channel.basic_publish(
-            exchange="", routing_key="low_priority_links", body=str(link.id)
-        )
-        return
+        links = link_repo.read_many(link_ids)
+        queue_names = {link.id: get_priority_queue(link) for link in links}
+
+    for link_id, queue_name in queue_names.items():
+        if queue_name is not None:
+            publisher.publish(queue_name, str(link_id))
 
 
 def main():
@@ -63,36 +40,32 @@ def main():
     channel.queue_declare(queue="medium_priority_links")
     channel.queue_declare(queue="high_priority_links")
 
-    def work(ch, method, properties, body: bytes):
-        try:
-            link_id = uuid.UUID(body.decode())
-        except Exception as e:
-            logger.critical(
-                f"Could not parse UUID {body.decode()}. [{type(e).__name__}]: {e}"
-            )
-            ch.basic_ack(delivery_tag=method.delivery_tag)
-            return
-
-        print(f" [prioritizer] [{worker_id}] Prioritizing link {link_id}")
-        ch.basic_ack(delivery_tag=method.delivery_tag)
-        try:
-            with Session(engine) as session:
-                process(link_id, session, channel)
-        except Exception as e:
-            logger.critical(
-                f"[{type(e).__name__}] - Lost {link_id} inside a prioritizer worker due to : {e}"
-            )
-
-    channel.basic_consume(queue="prioritizer", on_message_callback=work)
+    publisher = BatchPublisher(channel)
+
+    def work(items: list[str]):
+        link_ids = []
+        for item in items:
+            try:
+                link_ids.append(uuid.UUID(item))
+            except Exception as e:
+                logger.critical(
+                    f"Could not parse UUID {item}. [{type(e).__name__}]: {e}"
+                )
+
+        print(f" [prioritizer] [{worker_id}] Prioritizing {len(link_ids)} links")
+        with Session(engine) as session:
+            process(link_ids, session, publisher)
+
+    consumer = BatchConsumer(connection, channel, "prioritizer", work, publisher)
 
     try:
         print(
             " [prioritizer] [{worker_id}] Waiting for links to prioritize. To exit press CTRL+C"
         )
-        channel.start_consuming()
+        consumer.consume()
     except KeyboardInterrupt:
         print("Shutting down worker...")
-        channel.stop_consuming()
+        consumer.stop()
         connection.close()
     except Exception as e:
         logger.critical(
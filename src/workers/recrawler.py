@@ -0,0 +1,127 @@
+import logging
+import os
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+
+from pika import BlockingConnection, ConnectionParameters, PlainCredentials
+from prometheus_client import start_http_server
+from sqlalchemy.orm import Session
+
+from src.database.engine import engine
+from src.prometheus_exporters import RECRAWLER_SCHEDULED_COUNTER
+from src.repositories.LinkRepository import LinkRepository
+from src.utils.hashring import get_pool_queue
+from src.utils.messaging import BatchPublisher, declare_priority_pool
+from src.utils.parsers.urlparser import URLParser
+from src.utils.priority import get_priority
+from src.vars import (
+    NUM_SELECTOR_POOLS,
+    POOL_PRIORITIES,
+    PRIORITY_POOL_PREFIX,
+    RECRAWL_BATCH_SIZE,
+    RECRAWL_LEASE,
+    RECRAWL_PER_DOMAIN,
+    RECRAWL_PERIOD,
+    RECRAWL_SCAN_SIZE,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def process(session: Session, publisher: BatchPublisher, dispatch: bool = False) -> int:
+    """
+    Publishes a batch of due links to the prioritizer, or straight to the priority
+    pools with dispatch. Returns the number of links published.
+    """
+    worker_id = os.getenv("HOSTNAME", "unknown")
+
+    with session.begin():
+        link_repo = LinkRepository(session)
+        link_ids = link_repo.lease_due(
+            RECRAWL_BATCH_SIZE,
+            RECRAWL_SCAN_SIZE,
+            RECRAWL_PER_DOMAIN,
+            datetime.now() + timedelta(seconds=RECRAWL_LEASE),
+        )
+        links = link_repo.read_many(link_ids) if dispatch else []
+        priorities = {link.id: (link.url, get_priority(link)) for link in links}
+
+    if not dispatch:
+        for link_id in link_ids:
+            publisher.publish("prioritizer", str(link_id))
+    for link_id, (url, priority) in priorities.items():
+        if priority is not None:
+            queue_name = get_pool_queue(
+                URLParser(url).get_domain(), PRIORITY_POOL_PREFIX
+            )
+            publisher.publish(queue_name, str(link_id), POOL_PRIORITIES[priority])
+    publisher.flush()
+    RECRAWLER_SCHEDULED_COUNTER.labels(worker_id=worker_id).inc(len(link_ids))
+    return len(link_ids)
+
+
+def main():
+    arg_parser = ArgumentParser()
+    arg_parser.add_argument(
+        "--dispatch",
+        help="Publish links to the priority pools instead of the prioritizer.",
+        action="store_true",
+    )
+    args = arg_parser.parse_args()
+
+    worker_id = os.getenv("HOSTNAME", "unknown")
+    metrics_port = int(os.getenv("METRICS_PORT", "8000"))
+
+    start_http_server(metrics_port)
+    print(f"Started Prometheus metrics server on port {metrics_port}")
+
+    connection = BlockingConnection(
+        ConnectionParameters(
+            host=os.getenv("RABBITMQ_HOSTNAME", "localhost"),
+            port=os.getenv("RABBITMQ_AMQP_FORWARD_PORT", 5672),
+            credentials=PlainCredentials(
+                os.getenv("RABBITMQ_USERNAME", "guest"),
+                os.getenv("RABBITMQ_PASSWORD", "guest"),
+            ),
+        )
+    )
+    channel = connection.channel()
+
+    channel.queue_declare(queue="prioritizer")
+    if args.dispatch:
+        for i in range(1, NUM_SELECTOR_POOLS + 1):
+            declare_priority_pool(channel, f"{PRIORITY_POOL_PREFIX}{i}")
+
+    publisher = BatchPublisher(channel)
+
+    try:
+        print(
+            f" [recrawler] [{worker_id}] Publishing due links every {RECRAWL_PERIOD}s. To exit press CTRL+C"
+        )
+        while True:
+            try:
+                with Session(engine) as session:
+                    published = process(session, publisher, args.dispatch)
+                print(f" [recrawler] [{worker_id}] Published {published} due links")
+            except Exception as e:
+                published = 0
+                logger.critical(
+                    f"[{type(e).__name__}] - Lost a batch of due links inside recrawler worker due to : {e}"
+                )
+            # a full batch means more links are due already
+            if published < RECRAWL_BATCH_SIZE:
+                connection.sleep(RECRAWL_PERIOD)
+    except KeyboardInterrupt:
+        print("Shutting down worker...")
+        connection.close()
+    except Exception as e:
+        logger.critical(
+            f"[{type(e).__name__}] - Happened while checking processes : {e}"
+        )
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        logger.critical(f"[{type(e).__name__}] - Could not run main() due to : {e}")
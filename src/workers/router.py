@@ -1,31 +1,34 @@
 import logging
 import os
-import random
 import uuid
 from argparse import ArgumentParser
 
 from pika import BlockingConnection, ConnectionParameters
-from pika.adapters.blocking_connection import BlockingChannel
 from prometheus_client import start_http_server
 from sqlalchemy.orm import Session
 
 from src.database.engine import engine
 from src.repositories.LinkRepository import LinkRepository
-from src.vars import POOL_PREFIX
+from src.utils.hashring import get_pool_queue
+from src.utils.messaging import BatchConsumer, BatchPublisher
+from src.utils.parsers.urlparser import URLParser
+from src.vars import NUM_SELECTOR_POOLS, POOL_PREFIX
 
 logger = logging.getLogger(__name__)
 
 
-def process(link_id: uuid.UUID, session: Session, channel: BlockingChannel):
+def process(link_ids: list[uuid.UUID], session: Session, publisher: BatchPublisher):
     with session.begin():
         link_repo = LinkRepository(session)
-        link = link_repo.read_one(link_id)
-        if link is None:
-            logger.critical(f"Could not find link with ID {link_id}.")
-            return
-        pool_index = random.randint(1, 5)
-        queue_name = f"{POOL_PREFIX}{pool_index}"
-        channel.basic_publish(exchange="", routing_key=queue_name, body=str(link.id))
+        links = link_repo.read_many(link_ids)
+        urls = {link.id: link.url for link in links}
+    if len(urls) < len(link_ids):
+        missing_ids = set(link_ids).difference(urls)
+        logger.critical(f"Could not find links with IDs {missing_ids}.")
+
+    for link_id, url in urls.items():
+        domain_name = URLParser(url).get_domain()
+        publisher.publish(get_pool_queue(domain_name), str(link_id))
 
 
 def main():
@@ -51,37 +54,33 @@ def main():
     queue_name = f"{args.priority}_priority_links"
     channel.queue_declare(queue=queue_name)
     channel.queue_declare(queue="selector")
-    for i in range(1, int(os.getenv("NUM_SELECTOR_WORKER", 10)) + 1):
+    for i in range(1, NUM_SELECTOR_POOLS + 1):
         pool_queue_name = f"{POOL_PREFIX}{i}"
         channel.queue_declare(queue=pool_queue_name)
 
-    def work(ch, method, properties, body: bytes):
-        try:
-            link_id = uuid.UUID(body.decode())
-        except Exception as e:
-            logger.critical(
-                f"Could not parse UUID {body.decode()}. [{type(e).__name__}]: {e}"
-            )
-            ch.basic_ack(delivery_tag=method.delivery_tag)
-            return
-        print(f" [{queue_name}] Routing link {link_id}")
-        ch.basic_ack(delivery_tag=method.delivery_tag)
-        try:
-            with Session(engine) as session:
-                process(link_id, session, channel)
-        except Exception as e:
-            logger.critical(
-                f"[{type(e).__name__}] - Lost {link_id} inside {queue_name} worker due to : {e}"
-            )
-
-    channel.basic_consume(queue=queue_name, on_message_callback=work)
+    publisher = BatchPublisher(channel)
+
+    def work(items: list[str]):
+        link_ids = []
+        for item in items:
+            try:
+                link_ids.append(uuid.UUID(item))
+            except Exception as e:
+                logger.critical(
+                    f"Could not parse UUID {item}. [{type(e).__name__}]: {e}"
+                )
+        print(f" [{queue_name}] Routing {len(link_ids)} links")
+        with Session(engine) as session:
+            process(link_ids, session, publisher)
+
+    consumer = BatchConsumer(connection, channel, queue_name, work, publisher)
 
     try:
         print(f" [{queue_name}] Waiting for links to route. To exit press CTRL+C")
-        channel.start_consuming()
+        consumer.consume()
     except KeyboardInterrupt:
         print("Shutting down worker...")
-        channel.stop_consuming()
+        consumer.stop()
         connection.close()
     except Exception as e:
         logger.critical(
@@ -1,140 +1,261 @@
 import logging
 import os
-import re
-import time
 import uuid
 from argparse import ArgumentParser
-from datetime import datetime
-from urllib.parse import urlparse
+from collections import Counter
+from collections.abc import Mapping
 
 from pika import BlockingConnection, ConnectionParameters, PlainCredentials
-from pika.adapters.blocking_connection import BlockingChannel
 from prometheus_client import start_http_server
 from requests.exceptions import ConnectionError
 from sqlalchemy.orm import Session
 from urllib3.exceptions import MaxRetryError
 
 from src.database.engine import engine
+from src.database.urlfilter import get_url_filter
+from src.database.writebehind import WriteBehindBuffer
+from src.models.Domain import Domain
 from src.models.Link import Link
-from src.models.LinkRelation import LinkRelation
-from src.prometheus_exporters import SELECTOR_LINK_ADDED_COUNTER
-from src.repositories.DomainRepository import DomainRepository
+from src.prometheus_exporters import (
+    SELECTOR_LINK_ADDED_COUNTER,
+    SELECTOR_NEAR_DUPLICATE_COUNTER,
+)
+from src.repositories.DomainRepository import DomainRepository, upsert_domains
+from src.repositories.LinkContentRepository import LinkContentRepository
 from src.repositories.LinkRelationRepository import LinkRelationRepository
 from src.repositories.LinkRepository import LinkRepository
-from src.utils.httpclient import HTTPClient
+from src.repositories.LinkSimhashRepository import LinkSimhashRepository
+from src.utils.bloomfilter import BloomFilter
+from src.utils.crawl import (
+    Discovered,
+    get_conditional_headers,
+    get_content,
+    get_crawl_wait,
+    get_fingerprint,
+    get_outlink_values,
+    get_outlinks,
+    update_link,
+)
+from src.utils.crawlbudget import filter_over_budget, filter_traps
+from src.utils.frontier import Frontier, FrontierEntry
+from src.utils.httpclient import get_http_client
+from src.utils.messaging import (
+    BatchPublisher,
+    declare_priority_pool,
+    decode_batch,
+    get_batch_size,
+)
 from src.utils.parsers.crawlparser import CrawlParser
 from src.utils.parsers.urlparser import URLParser
-from src.vars import MAX_CONTENT_CHARS, POOL_PREFIX
+from src.utils.recrawl import schedule_recrawl
+from src.utils.scheduler import PolitenessScheduler
+from src.utils.simhash import to_signed
+from src.vars import (
+    FRONTIER_BATCH_SIZE,
+    FRONTIER_DIRECTORY,
+    POOL_PREFIX,
+    PRIORITY_POOL_PREFIX,
+    SELECTOR_MAX_HOST_BACKLOG,
+    SELECTOR_PREFETCH,
+    SELECTOR_RETRY_WAIT,
+    SIMHASH_BANDS,
+    SIMHASH_MAX_DISTANCE,
+    WRITE_BEHIND_INTERVAL_MS,
+    WRITE_BEHIND_MAX_ROWS,
+)
 
 logger = logging.getLogger(__name__)
 
 timeout_exceptions = (ConnectionError, MaxRetryError)
 
-URL_PATTERN = r"https?:\/\/(www\.)?[-a-zA-Z0-9@:%._\+~#=]{1,256}\.[a-zA-Z0-9()]{1,6}\b([-a-zA-Z0-9()@:%_\+.~#?&//=]*)"
 
+def load(link_id: uuid.UUID, session: Session) -> tuple[Link, Domain] | None:
+    link_repo = LinkRepository(session)
+    base_link = link_repo.read_one_with_domain(link_id)
+    if base_link is None:
+        logger.critical(f"Could not find link with ID {link_id}.")
+        return None
+    if base_link.domain is not None:
+        return base_link, base_link.domain
 
-def process(link_id: uuid.UUID, session: Session, channel: BlockingChannel):
+    # links discovered before domain_id existed
+    domain_repo = DomainRepository(session)
+    url_parser = URLParser(base_link.url)
+    domain_name = url_parser.get_domain()
+    domain = domain_repo.find_one_by_name(domain_name)
+    if domain is None:
+        logger.critical(f"Could not find domain {domain_name}.")
+        return None
+    base_link.domain_id = domain.id
+    return base_link, domain
+
+
+def mark_near_duplicate(
+    base_link: Link, fingerprint: int | None, session: Session
+) -> bool:
+    """
+    Stores the SimHash of base_link and returns whether it is a near-duplicate of
+    another page. Only the other pages are indexed, so that a duplicate always
+    points to an original.
+    """
+    simhash_repo = LinkSimhashRepository(session)
+    if fingerprint is None:
+        if base_link.simhash is not None:
+            simhash_repo.delete_one(base_link.id)
+        base_link.simhash = None
+        base_link.duplicate_of = None
+        return False
+
+    base_link.simhash = to_signed(fingerprint)
+    base_link.duplicate_of = simhash_repo.find_near_duplicate(
+        base_link.id, fingerprint, SIMHASH_BANDS, SIMHASH_MAX_DISTANCE
+    )
+    if base_link.duplicate_of is None:
+        simhash_repo.upsert_one(base_link.id, fingerprint, SIMHASH_BANDS)
+        return False
+    simhash_repo.delete_one(base_link.id)
+    return True
+
+
+def handle_response(
+    base_link: Link,
+    domain: Domain,
+    status_code: int,
+    headers: Mapping[str, str],
+    text: str | None,
+    session: Session,
+    buffer: WriteBehindBuffer | None = None,
+    url_filter: BloomFilter | None = None,
+) -> Discovered:
+    """
+    Stores the crawl result of base_link and its outgoing links.
+    Returns the newly inserted links and domains, to be published to the links and
+    domains queues. When a buffer is given, the updates of pages without new content
+    are left to it instead of the session. The content and outgoing links of
+    near-duplicate pages are skipped, as well as the outgoing links over the crawl
+    budget of their domain.
+    """
     worker_id = os.getenv("HOSTNAME", "unknown")
 
+    DomainRepository(session).invalidate(domain)
+    changed = update_link(base_link, domain, status_code, headers, text)
+    schedule_recrawl(base_link, changed)
+    if not changed:
+        if buffer is not None:
+            for instance in (base_link, domain):
+                buffer.add(instance)
+                session.expunge(instance)
+        return Discovered(urls=[], domain_names=[])
+
+    result = CrawlParser(text, base_link.url).parse()
+    content = get_content(result)
+    if mark_near_duplicate(base_link, get_fingerprint(content), session):
+        logger.info(f"Skipping {base_link.url}. Near-duplicate of another page")
+        SELECTOR_NEAR_DUPLICATE_COUNTER.labels(worker_id=worker_id).inc()
+        return Discovered(urls=[], domain_names=[])
+    if content is not None:
+        LinkContentRepository(session).upsert_one(base_link.id, content)
+    outlinks = filter_traps(get_outlinks(result))
+    if len(outlinks) < 1:
+        return Discovered(urls=[], domain_names=[])
+
+    domain_ids, new_domain_names = upsert_domains(outlinks, session)
+    domain_repo = DomainRepository(session)
+    domain_ids = filter_over_budget(
+        domain_ids, domain_repo.read_link_counts(set(domain_ids.values()))
+    )
+    link_repo = LinkRepository(session)
+    link_relation_repo = LinkRelationRepository(session)
+    ids, new_urls = link_repo.upsert_many(
+        get_outlink_values(result, domain_ids), url_filter
+    )
+    link_relation_repo.upsert_many(base_link.id, ids.values())
+    domain_repo.add_link_counts(Counter(domain_ids[url] for url in new_urls))
+    SELECTOR_LINK_ADDED_COUNTER.labels(worker_id=worker_id).inc(len(new_urls))
+    return Discovered(urls=new_urls, domain_names=new_domain_names)
+
+
+def process(
+    link_id: uuid.UUID,
+    session: Session,
+    publisher: BatchPublisher,
+    buffer: WriteBehindBuffer | None = None,
+    url_filter: BloomFilter | None = None,
+) -> int:
+    """
+    Crawls link_id, or returns the number of seconds to wait before its domain can be
+    crawled again when another worker crawled it in the meantime.
+    """
     with session.begin():
-        link_repo = LinkRepository(session)
-        base_link = link_repo.read_one(link_id)
-        if base_link is None:
-            logger.critical(f"Could not find link with ID {link_id}.")
-            return
-        domain_repo = DomainRepository(session)
-        url_parser = URLParser(base_link.url)
-        domain_name = url_parser.get_domain()
-        domain = domain_repo.find_one_by_name(domain_name)
-        if domain is None:
-            logger.critical(f"Could not find domain {domain_name}.")
-            return
+        loaded = load(link_id, session)
+        if loaded is None:
+            return 0
+        base_link, domain = loaded
 
-        if domain.last_crawled_at is not None:
-            crawl_delay = domain.crawl_delay
-            now = datetime.now()
-            diff = int((now - domain.last_crawled_at).total_seconds())
-            if diff < crawl_delay:
-                time.sleep(crawl_delay - diff)
+        crawl_wait = get_crawl_wait(domain)
+        if crawl_wait > 0:
+            return crawl_wait
 
         try:
-            http_client = HTTPClient()
-            res = http_client.fetch(base_link.url)
+            status_code, headers, text = get_http_client().fetch_html(
+                base_link.url, get_conditional_headers(base_link)
+            )
         except timeout_exceptions as e:
             # TODO urllib3.exceptions.NameResolutionError => DNS, special queue for outdated domains ?
             logger.error(
                 f"Fetching {base_link.url} resulted in [{type(e).__name__}]: {e}"
             )
-            return
+            return 0
 
-        domain.last_crawled_at = datetime.now()
-        base_link.last_crawled_at = datetime.now()
-        base_link.http_status = res.status_code
-        if res.status_code >= 400 and res.status_code <= 500:
-            logger.info(f"Skipping {base_link.url}. Status code {res.status_code}")
-            return
+        discovered = handle_response(
+            base_link, domain, status_code, headers, text, session, buffer, url_filter
+        )
 
-        content_type = res.headers.get("Content-Type")
-        base_link.content_type = content_type
-        if content_type is None or "text/html" not in content_type:
-            return
+    for domain_name in discovered.domain_names:
+        publisher.publish("domains", domain_name)
+    for new_url in discovered.urls:
+        publisher.publish("links", new_url)
+    return 0
 
-        crawl_parser = CrawlParser(res.text)
-        body_content = crawl_parser.get_semantic_content()
-        if body_content is not None:
-            if len(body_content) > MAX_CONTENT_CHARS:
-                body_content = body_content[:MAX_CONTENT_CHARS] + "...[truncated]"
-            base_link.content = body_content
-        hrefs = crawl_parser.get_safe_hrefs()
-        if len(hrefs) < 1:
-            return
 
-        unsafe_hrefs = crawl_parser.get_unsafe_hrefs()
-        for unsafe_href in unsafe_hrefs:
-            if unsafe_href.startswith("//") or unsafe_href.startswith("/"):
-                parsed_href = urlparse(unsafe_href)
-                pretty_href = f"{domain.protocol}://{domain.name}/{parsed_href.path}"
-                hrefs.append(pretty_href)
-
-        link_relation_repo = LinkRelationRepository(session)
-        for href in hrefs:
-            href_match = re.match(URL_PATTERN, href)
-            if href_match is None:
-                logger.error(f"href did not match URL pattern: {href}")
-                continue
-            if len(href) > 512:
-                continue
-            link = link_repo.find_one_by_url(href)
-            if link is not None:
-                link_relation = link_relation_repo.find_one_by_relation(
-                    link_id=base_link.id, has_link_id=link.id
-                )
-                if link_relation is not None:
-                    continue
-                link_relation = LinkRelation(link_id=base_link.id, has_link_id=link.id)
-                link_relation_repo.insert_one(link_relation)
-                continue
-
-            link = Link(
-                url=href,
-                title=crawl_parser.get_title(),
-                description=crawl_parser.get_description(),
-                keywords=crawl_parser.get_keywords(),
-                lang=crawl_parser.get_lang(),
-            )
-            link_repo.insert_one(link)
-            SELECTOR_LINK_ADDED_COUNTER.labels(worker_id=worker_id).inc()
-            link_relation = link_relation_repo.find_one_by_relation(
-                link_id=base_link.id, has_link_id=link.id
-            )
-            link_relation = LinkRelation(link_id=base_link.id, has_link_id=link.id)
-            link_relation_repo.insert_one(link_relation)
-            channel.basic_publish(exchange="", routing_key="links", body=link.url)
+def flush(buffer: WriteBehindBuffer):
+    size = len(buffer)
+    statements = buffer.drain()
+    if len(statements) < 1:
+        return
+    try:
+        with Session(engine) as session, session.begin():
+            for statement in statements:
+                session.execute(statement)
+    except Exception as e:
+        logger.critical(
+            f"[{type(e).__name__}] - Lost {size} buffered updates due to : {e}"
+        )
 
 
 def main():
     arg_parser = ArgumentParser()
     arg_parser.add_argument("index", help="The pool index for the worker to handle.")
+    arg_parser.add_argument(
+        "--dispatch",
+        help="Consume the priority pool fed by links workers started with --dispatch.",
+        action="store_true",
+    )
+    arg_parser.add_argument(
+        "--frontier",
+        help="Keep the pending links in a frontier on local disk instead of holding them unacked.",
+        action="store_true",
+    )
+    arg_parser.add_argument(
+        "--url-filter",
+        help="Look up only the links a url-seen filter may have seen before inserting them.",
+        action="store_true",
+    )
+    arg_parser.add_argument(
+        "--write-behind",
+        help="Batch the updates of pages without new content instead of committing them one by one.",
+        action="store_true",
+    )
     args = arg_parser.parse_args()
 
     metrics_port = int(os.getenv("METRICS_PORT", "8000"))
@@ -154,37 +275,186 @@ def main():
     )
     channel = connection.channel()
 
-    queue_name = f"{POOL_PREFIX}{args.index}"
-    channel.queue_declare(queue=queue_name)
+    if args.dispatch:
+        queue_name = f"{PRIORITY_POOL_PREFIX}{args.index}"
+        declare_priority_pool(channel, queue_name)
+    else:
+        queue_name = f"{POOL_PREFIX}{args.index}"
+        channel.queue_declare(queue=queue_name)
     channel.queue_declare(queue="links")
     channel.queue_declare(queue="domains")
+    # links wait unacked in the scheduler until their domain is ready, or are acked
+    # once stored in the frontier
+    channel.basic_qos(
+        prefetch_count=max(SELECTOR_PREFETCH // get_batch_size(queue_name), 1)
+    )
+
+    scheduler: PolitenessScheduler[tuple[uuid.UUID, int]] = PolitenessScheduler(
+        SELECTOR_MAX_HOST_BACKLOG
+    )
+    frontier = None
+    if args.frontier:
+        os.makedirs(FRONTIER_DIRECTORY, exist_ok=True)
+        frontier = Frontier(os.path.join(FRONTIER_DIRECTORY, f"{queue_name}.sqlite3"))
+        requeued = frontier.requeue_leased()
+        print(
+            f" [{queue_name}] Resuming with {len(frontier)} links in the frontier, {requeued} of which were being crawled"
+        )
+    publisher = BatchPublisher(channel)
+    url_filter = get_url_filter() if args.url_filter else None
+    # number of links of each message that are still to be crawled
+    remaining_links: dict[int, int] = {}
+    # messages whose links were crawled, acked once what they published is flushed
+    crawled_tags: list[int] = []
+    buffer = None
+    if args.write_behind:
+        buffer = WriteBehindBuffer(
+            WRITE_BEHIND_MAX_ROWS, WRITE_BEHIND_INTERVAL_MS / 1000
+        )
 
     def work(ch, method, properties, body: bytes):
         try:
-            link_id = uuid.UUID(body.decode())
+            items = decode_batch(body, properties.content_type)
         except Exception as e:
             logger.critical(
-                f"Could not parse UUID {body.decode()}. [{type(e).__name__}]: {e}"
+                f"Could not decode message {body!r}. [{type(e).__name__}]: {e}"
             )
             ch.basic_ack(delivery_tag=method.delivery_tag)
             return
+        link_ids = []
+        for item in items:
+            try:
+                link_ids.append(uuid.UUID(item))
+            except Exception as e:
+                logger.critical(
+                    f"Could not parse UUID {item}. [{type(e).__name__}]: {e}"
+                )
+        scheduled = []
+        try:
+            with Session(engine) as session, session.begin():
+                for link_id in link_ids:
+                    loaded = load(link_id, session)
+                    if loaded is not None:
+                        scheduled.append((link_id, loaded[1]))
+        except Exception as e:
+            requeue = not method.redelivered
+            action = "Requeued" if requeue else "Lost"
+            logger.critical(
+                f"[{type(e).__name__}] - {action} {len(link_ids)} links inside {queue_name} worker due to : {e}"
+            )
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=requeue)
+            return
+        if frontier is not None:
+            priority = properties.priority or 0
+            frontier.push_many(
+                (
+                    FrontierEntry(domain.name, link_id, priority),
+                    domain.crawl_delay,
+                    get_crawl_wait(domain),
+                )
+                for link_id, domain in scheduled
+            )
+        if len(scheduled) < 1 or frontier is not None:
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            return
+        remaining_links[method.delivery_tag] = len(scheduled)
+        for link_id, domain in scheduled:
+            pushed = scheduler.push(
+                domain.name,
+                (link_id, method.delivery_tag),
+                domain.crawl_delay,
+                get_crawl_wait(domain),
+            )
+            if not pushed:
+                # the domain has enough links pending, this one waits in the pool
+                publisher.publish(queue_name, str(link_id), properties.priority)
+                complete(method.delivery_tag)
+
+    # links whose last crawl failed, crawled once more after SELECTOR_RETRY_WAIT
+    failed_links: set[uuid.UUID] = set()
+
+    def crawl(link_id: uuid.UUID) -> int:
+        """
+        Returns the seconds to wait before crawling link_id again, 0 once it is done.
+        """
         print(f" [{queue_name}] Crawling {link_id}")
-        ch.basic_ack(delivery_tag=method.delivery_tag)
         try:
             with Session(engine) as session:
-                process(link_id, session, channel)
+                crawl_wait = process(link_id, session, publisher, buffer, url_filter)
+            failed_links.discard(link_id)
+            return crawl_wait
         except Exception as e:
-            logger.critical(
-                f"[{type(e).__name__}] - Lost {link_id} inside {queue_name} worker due to : {e}"
+            if link_id in failed_links:
+                failed_links.discard(link_id)
+                logger.critical(
+                    f"[{type(e).__name__}] - Lost {link_id} inside {queue_name} worker due to : {e}"
+                )
+                return 0
+            failed_links.add(link_id)
+            logger.error(
+                f"[{type(e).__name__}] - Retrying {link_id} in {SELECTOR_RETRY_WAIT}s inside {queue_name} worker due to : {e}"
             )
+            return SELECTOR_RETRY_WAIT
+        finally:
+            # crawls run back to back, the broker must still get heartbeats
+            connection.process_data_events(time_limit=0)
+
+    def complete(delivery_tag: int):
+        remaining_links[delivery_tag] -= 1
+        if remaining_links[delivery_tag] < 1:
+            del remaining_links[delivery_tag]
+            crawled_tags.append(delivery_tag)
+
+    def crawl_scheduled(domain_name: str, link_id: uuid.UUID, delivery_tag: int):
+        crawl_wait = crawl(link_id)
+        if crawl_wait > 0:
+            scheduler.retry(domain_name, (link_id, delivery_tag), crawl_wait)
+            return
+        complete(delivery_tag)
+
+    def crawl_frontier():
+        for entry in frontier.pop_ready(FRONTIER_BATCH_SIZE):
+            crawl_wait = crawl(entry.link_id)
+            if crawl_wait > 0:
+                frontier.retry(entry, crawl_wait)
+            else:
+                frontier.done(entry)
+
+    def settle():
+        publisher.flush()
+        for delivery_tag in crawled_tags:
+            channel.basic_ack(delivery_tag=delivery_tag)
+        crawled_tags.clear()
 
     channel.basic_consume(queue=queue_name, on_message_callback=work)
 
     try:
         print(f" [{queue_name}] Waiting for links to crawl. To exit press CTRL+C")
-        channel.start_consuming()
+        while True:
+            queue = frontier if frontier is not None else scheduler
+            time_limits = [queue.next_ready_in(), publisher.next_flush_in()]
+            if buffer is not None:
+                time_limits.append(buffer.next_flush_in())
+            time_limits = [limit for limit in time_limits if limit is not None]
+            connection.process_data_events(
+                time_limit=min(time_limits) if time_limits else None
+            )
+            if frontier is not None:
+                crawl_frontier()
+            while (scheduled := scheduler.pop()) is not None:
+                domain_name, (link_id, delivery_tag) = scheduled
+                crawl_scheduled(domain_name, link_id, delivery_tag)
+            if publisher.is_due() or len(publisher) < 1:
+                settle()
+            if buffer is not None and buffer.is_due():
+                flush(buffer)
     except KeyboardInterrupt:
         print("Shutting down worker...")
+        settle()
+        if buffer is not None:
+            flush(buffer)
+        if frontier is not None:
+            frontier.close()
         channel.stop_consuming()
         connection.close()
     except Exception as e:
@@ -0,0 +1,487 @@
+import asyncio
+import logging
+import os
+import uuid
+from argparse import ArgumentParser
+from collections import Counter
+from collections.abc import Mapping
+from typing import NamedTuple
+
+import aio_pika
+from aio_pika.abc import AbstractChannel, AbstractIncomingMessage
+from aiohttp import ClientError
+from prometheus_client import start_http_server
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.async_engine import async_engine, async_session
+from src.database.urlfilter import get_url_filter
+from src.database.writebehind import WriteBehindBuffer
+from src.models.Domain import Domain
+from src.models.Link import Link
+from src.prometheus_exporters import (
+    SELECTOR_LINK_ADDED_COUNTER,
+    SELECTOR_NEAR_DUPLICATE_COUNTER,
+)
+from src.repositories.AsyncDomainRepository import AsyncDomainRepository
+from src.repositories.AsyncLinkContentRepository import AsyncLinkContentRepository
+from src.repositories.AsyncLinkRelationRepository import AsyncLinkRelationRepository
+from src.repositories.AsyncLinkRepository import AsyncLinkRepository
+from src.repositories.AsyncLinkSimhashRepository import AsyncLinkSimhashRepository
+from src.repositories.DomainRepository import get_domains
+from src.utils.bloomfilter import BloomFilter
+from src.utils.crawl import (
+    Discovered,
+    get_conditional_headers,
+    get_content,
+    get_crawl_wait,
+    get_fingerprint,
+    get_outlink_values,
+    get_outlinks,
+    update_link,
+)
+from src.utils.crawlbudget import filter_over_budget, filter_traps
+from src.utils.httpclient import AsyncHTTPClient, get_async_http_client
+from src.utils.messaging import (
+    BATCH_CONTENT_TYPE,
+    decode_batch,
+    encode_batch,
+    get_batch_size,
+)
+from src.utils.parsers.crawlparser import CrawlParser
+from src.utils.parsers.urlparser import URLParser
+from src.utils.recrawl import schedule_recrawl
+from src.utils.scheduler import PolitenessScheduler
+from src.utils.simhash import to_signed
+from src.vars import (
+    POOL_PREFIX,
+    POOL_PRIORITIES,
+    PRIORITY_POOL_PREFIX,
+    SELECTOR_CONCURRENCY,
+    SELECTOR_MAX_HOST_BACKLOG,
+    SELECTOR_PREFETCH,
+    SIMHASH_BANDS,
+    SIMHASH_MAX_DISTANCE,
+    WRITE_BEHIND_INTERVAL_MS,
+    WRITE_BEHIND_MAX_ROWS,
+)
+
+logger = logging.getLogger(__name__)
+
+timeout_exceptions = (ClientError, TimeoutError)
+
+worker_id = os.getenv("HOSTNAME", "unknown")
+
+
+class CrawlTarget(NamedTuple):
+    link_id: uuid.UUID
+    url: str
+    conditional_headers: dict[str, str]
+    domain_name: str
+    crawl_delay: int
+    crawl_wait: int
+
+
+async def load(link_id: uuid.UUID, session: AsyncSession) -> tuple[Link, Domain] | None:
+    """
+    Same as selector.load.
+    """
+    link_repo = AsyncLinkRepository(session)
+    base_link = await link_repo.read_one_with_domain(link_id)
+    if base_link is None:
+        logger.critical(f"Could not find link with ID {link_id}.")
+        return None
+    if base_link.domain is not None:
+        return base_link, base_link.domain
+
+    domain_repo = AsyncDomainRepository(session)
+    domain_name = URLParser(base_link.url).get_domain()
+    domain = await domain_repo.find_one_by_name(domain_name)
+    if domain is None:
+        logger.critical(f"Could not find domain {domain_name}.")
+        return None
+    base_link.domain_id = domain.id
+    return base_link, domain
+
+
+async def prepare_many(link_ids: list[uuid.UUID]) -> list[CrawlTarget]:
+    async with async_session() as session, session.begin():
+        targets = []
+        for link_id in link_ids:
+            loaded = await load(link_id, session)
+            if loaded is None:
+                continue
+            base_link, domain = loaded
+            targets.append(
+                CrawlTarget(
+                    link_id=link_id,
+                    url=base_link.url,
+                    conditional_headers=get_conditional_headers(base_link),
+                    domain_name=domain.name,
+                    crawl_delay=domain.crawl_delay,
+                    crawl_wait=get_crawl_wait(domain),
+                )
+            )
+        return targets
+
+
+async def mark_near_duplicate(
+    base_link: Link, fingerprint: int | None, session: AsyncSession
+) -> bool:
+    """
+    Same as selector.mark_near_duplicate.
+    """
+    simhash_repo = AsyncLinkSimhashRepository(session)
+    if fingerprint is None:
+        if base_link.simhash is not None:
+            await simhash_repo.delete_one(base_link.id)
+        base_link.simhash = None
+        base_link.duplicate_of = None
+        return False
+
+    base_link.simhash = to_signed(fingerprint)
+    base_link.duplicate_of = await simhash_repo.find_near_duplicate(
+        base_link.id, fingerprint, SIMHASH_BANDS, SIMHASH_MAX_DISTANCE
+    )
+    if base_link.duplicate_of is None:
+        await simhash_repo.upsert_one(base_link.id, fingerprint, SIMHASH_BANDS)
+        return False
+    await simhash_repo.delete_one(base_link.id)
+    return True
+
+
+async def handle_response(
+    base_link: Link,
+    domain: Domain,
+    status_code: int,
+    headers: Mapping[str, str],
+    text: str | None,
+    session: AsyncSession,
+    buffer: WriteBehindBuffer | None = None,
+    url_filter: BloomFilter | None = None,
+) -> Discovered:
+    """
+    Same as selector.handle_response, parsing in a thread so that other crawls
+    keep running meanwhile.
+    """
+    AsyncDomainRepository(session).invalidate(domain)
+    changed = update_link(base_link, domain, status_code, headers, text)
+    schedule_recrawl(base_link, changed)
+    if not changed:
+        if buffer is not None:
+            for instance in (base_link, domain):
+                buffer.add(instance)
+                session.expunge(instance)
+        return Discovered(urls=[], domain_names=[])
+
+    result = await asyncio.to_thread(CrawlParser(text, base_link.url).parse)
+    content = get_content(result)
+    fingerprint = await asyncio.to_thread(get_fingerprint, content)
+    if await mark_near_duplicate(base_link, fingerprint, session):
+        logger.info(f"Skipping {base_link.url}. Near-duplicate of another page")
+        SELECTOR_NEAR_DUPLICATE_COUNTER.labels(worker_id=worker_id).inc()
+        return Discovered(urls=[], domain_names=[])
+    if content is not None:
+        await AsyncLinkContentRepository(session).upsert_one(base_link.id, content)
+    outlinks = filter_traps(get_outlinks(result))
+    if len(outlinks) < 1:
+        return Discovered(urls=[], domain_names=[])
+
+    domain_names, domains = get_domains(outlinks)
+    domain_repo = AsyncDomainRepository(session)
+    ids, new_domain_names = await domain_repo.upsert_many(domains)
+    domain_ids = {url: ids[domain_name] for url, domain_name in domain_names.items()}
+    domain_ids = filter_over_budget(
+        domain_ids, await domain_repo.read_link_counts(set(domain_ids.values()))
+    )
+    link_repo = AsyncLinkRepository(session)
+    link_relation_repo = AsyncLinkRelationRepository(session)
+    ids, new_urls = await link_repo.upsert_many(
+        get_outlink_values(result, domain_ids), url_filter
+    )
+    await link_relation_repo.upsert_many(base_link.id, ids.values())
+    await domain_repo.add_link_counts(Counter(domain_ids[url] for url in new_urls))
+    SELECTOR_LINK_ADDED_COUNTER.labels(worker_id=worker_id).inc(len(new_urls))
+    return Discovered(urls=new_urls, domain_names=new_domain_names)
+
+
+async def persist(
+    link_id: uuid.UUID,
+    status_code: int,
+    headers: Mapping[str, str],
+    text: str | None,
+    buffer: WriteBehindBuffer | None = None,
+    url_filter: BloomFilter | None = None,
+) -> Discovered:
+    async with async_session() as session, session.begin():
+        loaded = await load(link_id, session)
+        if loaded is None:
+            return Discovered(urls=[], domain_names=[])
+        base_link, domain = loaded
+        return await handle_response(
+            base_link, domain, status_code, headers, text, session, buffer, url_filter
+        )
+
+
+async def flush(buffer: WriteBehindBuffer):
+    """
+    Same as selector.flush.
+    """
+    size = len(buffer)
+    statements = buffer.drain()
+    if len(statements) < 1:
+        return
+    try:
+        async with async_session() as session, session.begin():
+            for statement in statements:
+                await session.execute(statement)
+    except Exception as e:
+        logger.critical(
+            f"[{type(e).__name__}] - Lost {size} buffered updates due to : {e}"
+        )
+
+
+async def process(
+    target: CrawlTarget,
+    http_client: AsyncHTTPClient,
+    channel: AbstractChannel,
+    buffer: WriteBehindBuffer | None = None,
+    url_filter: BloomFilter | None = None,
+):
+    try:
+        status_code, headers, text = await http_client.fetch_html(
+            target.url, target.conditional_headers
+        )
+    except timeout_exceptions as e:
+        logger.error(f"Fetching {target.url} resulted in [{type(e).__name__}]: {e}")
+        return
+
+    discovered = await persist(
+        target.link_id, status_code, headers, text, buffer, url_filter
+    )
+    # one envelope per crawled page
+    for routing_key, items in (
+        ("domains", discovered.domain_names),
+        ("links", discovered.urls),
+    ):
+        if len(items) > 0:
+            await channel.default_exchange.publish(
+                aio_pika.Message(
+                    body=encode_batch(items), content_type=BATCH_CONTENT_TYPE
+                ),
+                routing_key=routing_key,
+            )
+
+
+async def consume(
+    queue_name: str,
+    concurrency: int,
+    write_behind: bool,
+    dispatch: bool,
+    url_filter: bool,
+):
+    connection = await aio_pika.connect_robust(
+        host=os.getenv("RABBITMQ_HOSTNAME", "localhost"),
+        port=int(os.getenv("RABBITMQ_AMQP_FORWARD_PORT", 5672)),
+        login=os.getenv("RABBITMQ_USERNAME", "guest"),
+        password=os.getenv("RABBITMQ_PASSWORD", "guest"),
+    )
+    async with connection:
+        channel = await connection.channel()
+        # links wait unacked in the scheduler until their domain is ready
+        await channel.set_qos(
+            prefetch_count=max(SELECTOR_PREFETCH // get_batch_size(queue_name), 1)
+        )
+        queue_arguments = None
+        if dispatch:
+            queue_arguments = {"x-max-priority": max(POOL_PRIORITIES.values())}
+        queue = await channel.declare_queue(queue_name, arguments=queue_arguments)
+        await channel.declare_queue("links")
+        await channel.declare_queue("domains")
+
+        http_client = get_async_http_client()
+        scheduler: PolitenessScheduler[tuple[CrawlTarget, AbstractIncomingMessage]] = (
+            PolitenessScheduler(SELECTOR_MAX_HOST_BACKLOG)
+        )
+        scheduled_event = asyncio.Event()
+        in_flight = asyncio.Semaphore(concurrency)
+        tasks: set[asyncio.Task] = set()
+        buffer = None
+        if write_behind:
+            buffer = WriteBehindBuffer(
+                WRITE_BEHIND_MAX_ROWS, WRITE_BEHIND_INTERVAL_MS / 1000
+            )
+
+        # number of links of each message that are still to be crawled
+        remaining_links: dict[AbstractIncomingMessage, int] = {}
+
+        bloom_filter = None
+        if url_filter:
+            # built from the links table on first use
+            bloom_filter = await asyncio.to_thread(get_url_filter)
+
+        async def work(message: AbstractIncomingMessage):
+            try:
+                items = decode_batch(message.body, message.content_type)
+            except Exception as e:
+                logger.critical(
+                    f"Could not decode message {message.body!r}. [{type(e).__name__}]: {e}"
+                )
+                await message.ack()
+                return
+            link_ids = []
+            for item in items:
+                try:
+                    link_ids.append(uuid.UUID(item))
+                except Exception as e:
+                    logger.critical(
+                        f"Could not parse UUID {item}. [{type(e).__name__}]: {e}"
+                    )
+            try:
+                targets = await prepare_many(link_ids)
+            except Exception as e:
+                logger.critical(
+                    f"[{type(e).__name__}] - Lost {len(link_ids)} links inside {queue_name} worker due to : {e}"
+                )
+                targets = []
+            if len(targets) < 1:
+                await message.ack()
+                return
+            remaining_links[message] = len(targets)
+            for target in targets:
+                pushed = scheduler.push(
+                    target.domain_name,
+                    (target, message),
+                    target.crawl_delay,
+                    target.crawl_wait,
+                )
+                if not pushed:
+                    # the domain has enough links pending, this one waits in the pool
+                    await channel.default_exchange.publish(
+                        aio_pika.Message(
+                            body=encode_batch([str(target.link_id)]),
+                            content_type=BATCH_CONTENT_TYPE,
+                            priority=message.priority,
+                        ),
+                        routing_key=queue_name,
+                    )
+                    await complete(message)
+            scheduled_event.set()
+
+        async def crawl(target: CrawlTarget, message: AbstractIncomingMessage):
+            print(f" [{queue_name}] Crawling {target.link_id}")
+            try:
+                await process(target, http_client, channel, buffer, bloom_filter)
+                if buffer is not None and buffer.is_due():
+                    await flush(buffer)
+            except Exception as e:
+                logger.critical(
+                    f"[{type(e).__name__}] - Lost {target.link_id} inside {queue_name} worker due to : {e}"
+                )
+            finally:
+                in_flight.release()
+                await complete(message)
+
+        async def complete(message: AbstractIncomingMessage):
+            remaining_links[message] -= 1
+            if remaining_links[message] < 1:
+                del remaining_links[message]
+                await message.ack()
+
+        async def dispatch():
+            while True:
+                await in_flight.acquire()
+                scheduled = scheduler.pop()
+                while scheduled is None:
+                    scheduled_event.clear()
+                    try:
+                        await asyncio.wait_for(
+                            scheduled_event.wait(), scheduler.next_ready_in()
+                        )
+                    except TimeoutError:
+                        pass
+                    scheduled = scheduler.pop()
+                _, (target, message) = scheduled
+                task = asyncio.create_task(crawl(target, message))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+        async def flush_periodically():
+            while True:
+                next_flush_in = buffer.next_flush_in()
+                if next_flush_in is None:
+                    next_flush_in = WRITE_BEHIND_INTERVAL_MS / 1000
+                await asyncio.sleep(next_flush_in)
+                if buffer.is_due():
+                    await flush(buffer)
+
+        flusher = None
+        if buffer is not None:
+            flusher = asyncio.create_task(flush_periodically())
+
+        try:
+            await queue.consume(work)
+            print(
+                f" [{queue_name}] Waiting for links to crawl with {concurrency} in flight. To exit press CTRL+C"
+            )
+            await dispatch()
+        finally:
+            if flusher is not None:
+                flusher.cancel()
+            if buffer is not None:
+                await flush(buffer)
+            await http_client.close()
+            await async_engine.dispose()
+
+
+def main():
+    arg_parser = ArgumentParser()
+    arg_parser.add_argument("index", help="The pool index for the worker to handle.")
+    arg_parser.add_argument(
+        "--concurrency",
+        help="The maximum number of links crawled at the same time.",
+        type=int,
+        default=SELECTOR_CONCURRENCY,
+    )
+    arg_parser.add_argument(
+        "--dispatch",
+        help="Consume the priority pool fed by links workers started with --dispatch.",
+        action="store_true",
+    )
+    arg_parser.add_argument(
+        "--url-filter",
+        help="Look up only the links a url-seen filter may have seen before inserting them.",
+        action="store_true",
+    )
+    arg_parser.add_argument(
+        "--write-behind",
+        help="Batch the updates of pages without new content instead of committing them one by one.",
+        action="store_true",
+    )
+    args = arg_parser.parse_args()
+
+    metrics_port = int(os.getenv("METRICS_PORT", "8000"))
+
+    start_http_server(metrics_port)
+    print(f"Started Prometheus metrics server on port {metrics_port}")
+
+    queue_prefix = PRIORITY_POOL_PREFIX if args.dispatch else POOL_PREFIX
+    queue_name = f"{queue_prefix}{args.index}"
+    try:
+        asyncio.run(
+            consume(
+                queue_name,
+                args.concurrency,
+                args.write_behind,
+                args.dispatch,
+                args.url_filter,
+            )
+        )
+    except KeyboardInterrupt:
+        print("Shutting down worker...")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        logger.critical(f"[{type(e).__name__}] - Could not run main() due to : {e}")
@@ -1,52 +1,110 @@
 import logging
 import os
+from argparse import ArgumentParser
+from collections import Counter
 
 from pika import BlockingConnection, ConnectionParameters
-from pika.adapters.blocking_connection import BlockingChannel
 from prometheus_client import start_http_server
 from sqlalchemy.orm import Session
 
 from src.database.engine import engine
+from src.database.urlfilter import get_url_filter
 from src.prometheus_exporters import (
     SITEMAPS_LINK_ADDED_COUNTER,
     SITEMAPS_PROCESSED_COUNTER,
 )
+from src.repositories.DomainRepository import DomainRepository, upsert_domains
 from src.repositories.LinkRepository import LinkRepository
-from src.utils.httpclient import HTTPClient
-from src.utils.parsers.sitemapparser import SitemapParser
-from src.utils.parsers.urlparser import URLParser
+from src.utils.bloomfilter import BloomFilter
+from src.utils.canonicalizer import canonicalize
+from src.utils.crawlbudget import filter_over_budget
+from src.utils.httpclient import get_http_client
+from src.utils.messaging import BatchConsumer, BatchPublisher
+from src.utils.parsers.sitemapparser import (
+    SitemapEntry,
+    SitemapParser,
+    open_sitemap,
+)
+from src.vars import SITEMAP_BATCH_SIZE
 
 logger = logging.getLogger(__name__)
 
 
-def process(sitemap_url: str, session: Session, channel: BlockingChannel):
+def process_batch(
+    entries: list[SitemapEntry],
+    session: Session,
+    publisher: BatchPublisher,
+    url_filter: BloomFilter | None = None,
+):
     worker_id = os.getenv("HOSTNAME", "unknown")
-    http_client = HTTPClient()
+    pretty_entries = {}
+    for entry in entries:
+        if entry.is_index:
+            publisher.publish("sitemaps", entry.loc)
+            continue
+        try:
+            pretty_url = canonicalize(entry.loc)
+        except ValueError as e:
+            logger.error(f"Could not parse URL {entry.loc}. [{type(e).__name__}]: {e}")
+            continue
+        # urls that cannot be crawled, such as urls without a host, are left out
+        if pretty_url is None or len(pretty_url) > 512:
+            continue
+        pretty_entries[pretty_url] = entry
 
+    with session.begin():
+        domain_ids, new_domain_names = upsert_domains(pretty_entries, session)
+        domain_repo = DomainRepository(session)
+        domain_ids = filter_over_budget(
+            domain_ids, domain_repo.read_link_counts(set(domain_ids.values()))
+        )
+        rows = [
+            (pretty_url, domain_id, entry.priority, entry.change_freq)
+            for pretty_url, entry in pretty_entries.items()
+            if (domain_id := domain_ids.get(pretty_url)) is not None
+        ]
+        link_repo = LinkRepository(session)
+        link_urls = link_repo.copy_many(rows, url_filter)
+        domain_repo.add_link_counts(Counter(domain_ids[url] for url in link_urls))
+    SITEMAPS_LINK_ADDED_COUNTER.labels(worker_id=worker_id).inc(len(link_urls))
+
+    for domain_name in new_domain_names:
+        publisher.publish("domains", domain_name)
+    # links that were already known are left to the selector
+    for link_url in link_urls:
+        publisher.publish("links", link_url)
+
+
+def process(
+    sitemap_url: str,
+    session: Session,
+    publisher: BatchPublisher,
+    url_filter: BloomFilter | None = None,
+):
     try:
-        http_client = HTTPClient()
-        res = http_client.fetch(sitemap_url)
+        res = get_http_client().stream(sitemap_url)
     except Exception as e:
         logger.error(f"Fetching {sitemap_url} resulted in [{type(e).__name__}]: {e}")
         return
 
-    parser = SitemapParser(res.text)
-    for index_url in parser.get_indexes():
-        channel.basic_publish(exchange="", routing_key="sitemaps", body=index_url)
-    for link in parser.get_links():
-        if len(link.url) > 512:
-            continue
-        url_parser = URLParser(link.url)
-        pretty_url = url_parser.prettify()
-        link_repo = LinkRepository(session)
-        link_db = link_repo.find_one_by_url(pretty_url)
-        if link_db is None:
-            link_repo.insert_one(link)
-            SITEMAPS_LINK_ADDED_COUNTER.labels(worker_id=worker_id).inc()
-        channel.basic_publish(exchange="", routing_key="links", body=pretty_url)
+    with res:
+        if res.status_code != 200:
+            logger.error(f"Fetching {sitemap_url} resulted in {res.status_code}")
+            return
+        parser = SitemapParser(open_sitemap(res.raw))
+        for entries in parser.iter_batches(SITEMAP_BATCH_SIZE):
+            process_batch(entries, session, publisher, url_filter)
 
 
 def main():
+    arg_parser = ArgumentParser()
+    arg_parser.add_argument(
+        "--url-filter",
+        help="Look up only the links a url-seen filter may have seen before inserting them.",
+        action="store_true",
+    )
+    args = arg_parser.parse_args()
+
     worker_id = os.getenv("HOSTNAME", "unknown")
     metrics_port = int(os.getenv("METRICS_PORT", "8000"))
 
@@ -58,30 +116,33 @@ def main():
 
     channel.queue_declare(queue="sitemaps")
     channel.queue_declare(queue="links")
+    channel.queue_declare(queue="domains")
 
-    def work(ch, method, properties, body: bytes):
-        sitemap_url = body.decode()
-        print(f" [x] Processing sitemap {sitemap_url}")
-        ch.basic_ack(delivery_tag=method.delivery_tag)
-        try:
-            with Session(engine) as session:
-                process(sitemap_url, session, channel)
-                SITEMAPS_PROCESSED_COUNTER.labels(worker_id=worker_id).inc()
-        except Exception as e:
-            logger.critical(
-                f"[{type(e).__name__}] - Lost {sitemap_url} inside a sitemap worker due to : {e}"
-            )
+    publisher = BatchPublisher(channel)
+    url_filter = get_url_filter() if args.url_filter else None
+
+    def work(sitemap_urls: list[str]):
+        for sitemap_url in sitemap_urls:
+            print(f" [x] Processing sitemap {sitemap_url}")
+            try:
+                with Session(engine) as session:
+                    process(sitemap_url, session, publisher, url_filter)
+                    SITEMAPS_PROCESSED_COUNTER.labels(worker_id=worker_id).inc()
+            except Exception as e:
+                logger.critical(
+                    f"[{type(e).__name__}] - Lost {sitemap_url} inside a sitemap worker due to : {e}"
+                )
 
-    channel.basic_consume(queue="sitemaps", on_message_callback=work)
+    consumer = BatchConsumer(connection, channel, "sitemaps", work, publisher)
 
     try:
-        channel.start_consuming()
         print(
             f" [sitemaps] [{worker_id}] Waiting for sitemaps to process. To exit press CTRL+C"
         )
+        consumer.consume()
     except KeyboardInterrupt:
         print("Shutting down worker...")
-        channel.stop_consuming()
+        consumer.stop()
         connection.close()
     except Exception as e:
         logger.critical(